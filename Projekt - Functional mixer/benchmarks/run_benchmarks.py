@@ -0,0 +1,487 @@
+import os
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy') #bez karty dźwiękowej i bez okna - zwykły serwer z Linuksem
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import glob
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+from functools import partial
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+import pygame
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from audio_processor import AudioProcessor
+from audio_state import AudioState
+from deck_source import open_source, pcm_path, StreamingDeck, SHARED_TMP, soundfile
+from dsp import EffectRack, load_kernels
+from metering import LevelMeter
+from metrics import Metrics
+from peak_pyramid import PeakPyramid
+from mixer_engine import MixerEngine
+from scheduler import Scheduler
+from scrolling_view import ScrollingWaveformView
+from update_bus import UpdateBus
+from utils import Utils
+from waveform_display import WaveformDisplay
+
+BEATS_DIR = os.path.join(HERE, '..', 'beats')
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def write_synthetic_wav(filename, seconds, sample_rate=44100, seed=0): #długi utwór: stopa co beat + szum, 16 bit stereo
+    rng = np.random.default_rng(seed)
+    with wave.open(filename, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        beat = np.sin(2 * np.pi * 55 * np.arange(4000) / sample_rate) * np.exp(-np.arange(4000) / 1500)
+        period = int(sample_rate * 60 / 124)
+        for start in range(0, int(seconds * sample_rate), sample_rate * 10): #zapis po 10 s - bez całego pliku w pamięci
+            frames = min(sample_rate * 10, int(seconds * sample_rate) - start)
+            signal = rng.standard_normal(frames) * 0.05
+            for offset in range(-(start % period) % period, frames, period):
+                end = min(frames, offset + len(beat))
+                signal[offset:end] += beat[:end - offset] * 0.8
+            pcm = (np.clip(signal, -1, 1) * 32767).astype('<i2')
+            f.writeframes(np.repeat(pcm[:, None], 2, axis=1).tobytes())
+
+
+def measure(func, repeats, warmup=1) -> dict: #mediana jest odporna na pojedyncze zakłócenia systemu
+    list(map(lambda _: func(), range(warmup)))
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return {'median': float(np.median(times)), 'min': float(min(times)), 'repeats': repeats, 'unit': 's'}
+
+
+def make_app(num_decks=2): #minimalny kontekst aplikacji bez okna tkinter - te same klasy, które pracują w mikserze
+    app = types.SimpleNamespace()
+    app.num_decks = num_decks
+    app.shutdown_event = threading.Event()
+    app.update_bus = UpdateBus()
+    app.scheduler = Scheduler(app.shutdown_event)
+    app.audio_state = AudioState(num_decks)
+    app.idle_report = False
+    app.metrics = Metrics()
+    app.utils = Utils(app)
+    app.waveform_display = WaveformDisplay(app)
+    return app
+
+
+class HeadlessRoot: #after_idle wykonywany od razu w wątku schedulera - mierzymy bus i budzenie, nie pętlę tk
+    def after_idle(self, func, *args):
+        func(*args)
+
+
+class HeadlessImage: #PhotoImage bez tk - klatka PPM gotowa, wyświetlenie pomijamy
+    def __init__(self, width):
+        self._width = width
+
+    def width(self):
+        return self._width
+
+    def configure(self, **options):
+        self._width = options.get('width', self._width)
+
+
+def start_update_loop(app, on_update): #konsument gui_updates jak w mikserze, aktualizacje trafiają do on_update
+    app.root = HeadlessRoot()
+    app.utils._execute_gui_update = on_update
+    app.scheduler.register('gui_updates', app.utils._process_gui_updates, 0.016,
+                           is_active=lambda: app.update_bus.pending() and not app.utils._batch_pending)
+    app.scheduler.start()
+
+
+def bench_startup_import(repeats): #świeży interpreter + import main - to, na co czeka użytkownik przed pokazaniem okna
+    return measure(lambda: subprocess.run([sys.executable, '-c', 'import main'], cwd=SRC_DIR, check=True,
+                                          stdout=subprocess.DEVNULL), repeats)
+
+
+def bench_sound_load(files, repeats):
+    return measure(lambda: list(map(pygame.mixer.Sound, files)), repeats)
+
+
+def bench_open_stream(filename, repeats): #ścieżka ładowania decka: źródło + pierwszy kawałek w buforze
+    def run():
+        stream = StreamingDeck(open_source(filename, 44100), 44100)
+        stream.fill()
+    return measure(run, repeats)
+
+
+def bench_process_audio(processor, files, repeats):
+    return measure(lambda: list(map(lambda f: processor.process_audio(open_source(f, 44100)), files)), repeats)
+
+
+def bench_compressed_load(processor, filename, repeats) -> dict: #mp3/ogg: obwiednia + bpm, każdy czytelnik dekoduje sam vs jedno wspólne pcm
+    compressed = os.path.splitext(filename)[0] + '.ogg'
+    with soundfile.SoundFile(compressed, 'w', 44100, 2, format='OGG') as out: #kawałkami - duży zapis naraz wywraca libvorbis
+        for block in soundfile.blocks(filename, blocksize=8192, dtype='float32'):
+            out.write(block)
+
+    def separate():
+        processor.process_audio(open_source(compressed, 44100))
+        processor.calculate_bpm_advanced(compressed)
+
+    def shared():
+        decode_dir = tempfile.mkdtemp(dir=SHARED_TMP)
+        try:
+            source = open_source(compressed, 44100, decode_dir)
+            processor.process_audio(source)
+            processor.calculate_bpm_advanced(pcm_path(source, compressed))
+        finally:
+            shutil.rmtree(decode_dir, ignore_errors=True)
+    return {'compressed_load_separate': measure(separate, repeats), 'compressed_load_shared': measure(shared, repeats)}
+
+
+def bench_bpm(processor, filename, repeats):
+    return measure(partial(processor.calculate_bpm_advanced, filename), repeats)
+
+
+def bench_waveform(filename, repeats, num_decks=2) -> dict: #pełne przerysowanie po załadowaniu pliku i pojedyncza klatka blit
+    app = make_app(num_decks)
+    display = app.waveform_display
+    display.create_figure()
+    display.canvas = FigureCanvasAgg(display.fig)
+    display.canvas.draw_idle = lambda *args, **kwargs: None #Agg rysuje draw_idle od razu - w gui to jedno odświeżenie pętli tk
+    display.setup_animation()
+    source = open_source(filename, 44100)
+    pyramid = AudioProcessor().process_audio(source)
+    duration = source.frames / source.sample_rate
+    list(map(lambda deck: app.audio_state.update(deck, waveform=pyramid, duration=duration, playing=True), range(num_decks)))
+
+    def full_redraw(): #nowe obwiednie wszystkich decków i dokładnie jedno pełne draw()
+        list(map(display.update_waveform_static, range(num_decks)))
+        display.canvas.draw()
+
+    positions = iter(np.linspace(0, duration, 1 << 20))
+
+    def frame():
+        position = next(positions)
+        list(map(lambda deck: app.audio_state.update(deck, current_position=position), range(num_decks)))
+        display.render_frame()
+
+    full_redraw()
+    results = {'waveform_full_redraw': measure(full_redraw, repeats),
+               'waveform_blit_frame': measure(frame, repeats * 50)}
+    beats = tuple(np.arange(0.0, duration, 60.0 / 124)) #siatka całego utworu - tysiące beatów
+    list(map(lambda deck: app.audio_state.update(deck, beat_times=beats), range(num_decks)))
+    list(map(display.update_beat_grid, range(num_decks)))
+    windows = iter(np.linspace(0, duration - 8.0, 1 << 20))
+    ax = display.axes[0]
+
+    def scroll(): #przesunięcie widoku o kawałek - obwiednia i siatka tylko dla widocznych 8 s
+        left = next(windows)
+        ax.set_xlim(left, left + 8.0)
+    results['waveform_scroll_with_grid'] = measure(scroll, repeats * 20)
+    ax.set_xlim(0, duration) #cały utwór - przy gęstej siatce zostają pierwsze beaty taktów albo nic
+    print(f"beat grid: {len(beats)} beats, {len(ax.beat_grid_lines.get_segments())} lines drawn zoomed out")
+    return results
+
+
+def bench_scrolling(repeats, num_decks=8) -> dict: #przybliżony widok 60 fps - czas klatki nie może zależeć od długości utworu
+    results = {}
+    rng = np.random.default_rng(0)
+    for name, seconds in (('short', 30), ('long', 3600)):
+        app = make_app(num_decks)
+        view = ScrollingWaveformView(app, width=1200)
+        view.image = HeadlessImage(view.width)
+        app.root = HeadlessRoot()
+        blocks = int(seconds * 44100 / 256)
+        level0 = np.abs(rng.standard_normal((blocks, 3)).astype(np.float32)) * np.array([-0.5, 0.5, 0.1], dtype=np.float32)
+        pyramid = PeakPyramid.from_base_level(level0, 256, 44100, blocks * 256)
+        beats = tuple(np.arange(0.0, seconds, 60.0 / 124))
+        list(map(lambda deck: app.audio_state.update(deck, waveform=pyramid, duration=pyramid.duration, beat_times=beats,
+                                                     paused=True), range(num_decks)))
+        positions = iter(np.arange(1 << 20) / 60.0 % (seconds - 10) + 5.0)
+
+        def frame(): #głowica o 1/60 s dalej na wszystkich deckach - przesunięcie bufora o kilka kolumn
+            position = next(positions)
+            list(map(lambda deck: app.audio_state.update(deck, current_position=position), range(num_decks)))
+            view.render_frame()
+        results[f"scrolling_frame_8_decks_{name}"] = measure(frame, repeats * 100)
+    factors = iter(np.tile([0.8, 1.25], 1 << 16))
+    #zmiana skali - wszystkie decki rysowane od zera na całej szerokości
+    results['scrolling_zoom_8_decks'] = measure(lambda: (view.zoom(next(factors)), view.render_frame()), repeats * 10)
+    return results
+
+
+def bench_update_round_trip(repeats) -> dict: #post_update -> scheduler -> dispatch, czas jednej wiadomości
+    app = make_app()
+    delivered = threading.Event()
+    start_update_loop(app, lambda *update: delivered.set())
+
+    def round_trip():
+        delivered.clear()
+        app.utils.post_update('bpm_update', (0, 120.0, 0.9))
+        delivered.wait(1.0)
+    try:
+        return measure(round_trip, repeats * 20)
+    finally:
+        app.scheduler.stop()
+
+
+def bench_update_burst(repeats, num_decks=8, producers=4, per_producer=500) -> dict: #ładowanie wielu decków naraz
+    app = make_app(num_decks)
+    done = threading.Event()
+    start_update_loop(app, lambda update_type, data, enqueued=None: update_type == 'error' and done.set())
+
+    def produce(producer):
+        for i in range(per_producer):
+            deck = (producer + i) % num_decks
+            app.utils.post_update('bpm_progress', (deck, 120.0 + i, 0.5))
+            app.utils.post_update('waveform_update', deck)
+
+    def burst():
+        done.clear()
+        threads = list(map(lambda producer: threading.Thread(target=produce, args=(producer,)), range(producers)))
+        list(map(lambda thread: thread.start(), threads))
+        list(map(lambda thread: thread.join(), threads))
+        app.utils.post_update('error', 'end of burst') #bez scalania - dochodzi po wszystkich wcześniejszych
+        done.wait(5.0)
+    try:
+        return measure(burst, repeats * 4) #czas zależy od fazy ticka schedulera - więcej powtórzeń do stabilnej mediany
+    finally:
+        app.scheduler.stop()
+
+
+def bench_render_block(filename, repeats, num_decks=2): #koszt jednego bloku miksu wszystkich decków (bez urządzenia audio)
+    engine = MixerEngine(num_decks=num_decks, frequency=44100, block_size=512)
+    list(map(lambda deck: engine.load(deck, StreamingDeck(open_source(filename, 44100), 44100)), range(num_decks)))
+    list(map(engine.play, range(num_decks)))
+    out = np.zeros((512, 2), dtype=np.float32)
+
+    def blocks():
+        for _ in range(100):
+            engine.render_block(out)
+            list(map(lambda stream: stream.fill(), engine.decks))
+    try:
+        return measure(blocks, repeats)
+    finally:
+        engine.close()
+
+
+def bench_effects(repeats, num_decks=8) -> dict: #EQ + filtr na wszystkich deckach: pokrętła w miejscu i w ruchu
+    rack = EffectRack(num_decks)
+    source = np.random.default_rng(0).standard_normal((num_decks, 512, 2)).astype(np.float32) * 0.1
+    stack = source.copy()
+    decks = list(range(num_decks))
+
+    def block(): #świeży sygnał w każdym bloku, jak z bufora decka - filtrowanie w kółko tych samych próbek wygasza je do zera
+        np.copyto(stack, source)
+        rack.process(decks, stack)
+    list(map(lambda deck: (rack.set_eq(deck, 0, -12.0), rack.set_filter(deck, -0.4)), decks))
+    list(map(lambda _: block(), range(100))) #dojście do celu - dalej współczynniki z cache
+    settled = measure(block, repeats * 200)
+    moves = iter(np.sin(np.arange(1 << 20) / 10.0))
+
+    def moving_block(): #jedno pokrętło w ruchu na każdym decku - współczynniki przeliczane co podblok
+        value = next(moves)
+        list(map(lambda deck: rack.set_filter(deck, value), decks))
+        block()
+    moving = measure(moving_block, repeats * 200)
+    budget = 512 / 44100
+    print(f"effects: {num_decks / settled['median'] * budget:.0f} decks fit in a 512-frame period (settled), "
+          f"{num_decks / moving['median'] * budget:.0f} with every filter moving")
+    return {'effects_8_decks': settled, 'effects_8_decks_moving': moving}
+
+
+def bench_metering(repeats, num_decks=8) -> dict: #peak/rms/LUFS wszystkich decków i mastera w callbacku + odczyt gui
+    load_kernels() #filtr K jak po starcie mixera - bez niego liczą się tylko peak i rms
+    meter = LevelMeter(num_decks)
+    stack = np.random.default_rng(0).standard_normal((num_decks, 512, 2)).astype(np.float32) * 0.1
+    mix = stack.sum(axis=0)
+    decks = list(range(num_decks))
+    block = measure(partial(meter.process, decks, stack, mix), repeats * 200)
+
+    def read(): #odczyt 30 razy na sekundę - w kolejce ~3 bloki do przepuszczenia przez filtr K
+        list(map(lambda _: meter.process(decks, stack, mix), range(3)))
+        meter.snapshot()
+    snapshot = measure(read, repeats * 200)
+    print(f"metering: {100 * block['median'] / (512 / 44100):.2f}% of a 512-frame period with {num_decks} decks")
+    return {'metering_8_decks': block, 'meter_read_3_blocks': snapshot}
+
+
+def bench_realtime(filename, num_decks, seconds) -> dict: #bloki w tempie karty dźwiękowej, bufory uzupełnia wątek tła jak w mikserze
+    engine = MixerEngine(num_decks=num_decks, frequency=44100, block_size=512)
+    streams = list(map(lambda _: StreamingDeck(open_source(filename, 44100), 44100), range(num_decks)))
+    list(map(engine.load, range(num_decks), streams))
+    time.sleep(0.2) #jak w gui - pierwszy kawałek jest w buforze zanim deck zagra
+    list(map(engine.play, range(num_decks)))
+    out = np.zeros((512, 2), dtype=np.float32)
+    budget = 512 / 44100
+    deadline = time.perf_counter()
+    try:
+        for _ in range(int(seconds / budget)):
+            engine.render_block(out)
+            deadline += budget
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+        times = np.fromiter(engine.block_times, dtype=np.float64)
+        return {'median': float(np.median(times)), 'min': float(times.min()), 'repeats': len(times), 'unit': 's',
+                'underruns': sum(map(lambda stream: stream.underruns, streams)), 'overruns': engine.overruns}
+    finally:
+        engine.close()
+
+
+def run_all(workdir, quick=False, only=None) -> dict: #only - nazwy wyników do zmierzenia (None - wszystkie)
+    repeats = 3 if quick else 5
+    beats = sorted(glob.glob(os.path.join(BEATS_DIR, '*.wav')))
+    long_file = os.path.join(workdir, 'synthetic_long.wav')
+    write_synthetic_wav(long_file, 120 if quick else 600)
+    processor = AudioProcessor()
+    results = {}
+    print(f"beats: {len(beats)} files, synthetic: {os.path.getsize(long_file) / 2 ** 20:.0f} MB")
+    steps = [ #(wyniki kroku, pomiar)
+        (('startup_import',), partial(bench_startup_import, repeats)),
+        (('sound_load_beats',), partial(bench_sound_load, beats, repeats)),
+        (('sound_load_long',), partial(bench_sound_load, [long_file], repeats)),
+        (('open_stream_long',), partial(bench_open_stream, long_file, repeats)),
+        (('process_audio_beats',), partial(bench_process_audio, processor, beats, repeats)),
+        (('process_audio_long',), partial(bench_process_audio, processor, [long_file], repeats)),
+        *([(('compressed_load_separate', 'compressed_load_shared'),
+            partial(bench_compressed_load, processor, long_file, max(1, repeats // 2)))]
+          if soundfile is not None else []), #bez soundfile nie ma czym zakodować pliku testowego
+        (('bpm_beat',), partial(bench_bpm, processor, beats[0], repeats)),
+        (('bpm_long',), partial(bench_bpm, processor, long_file, max(1, repeats // 2))),
+        (('render_block_x100',), partial(bench_render_block, long_file, repeats)),
+        (('render_block_8_decks_x100',), partial(bench_render_block, long_file, repeats, 8)),
+        (('effects_8_decks', 'effects_8_decks_moving'), partial(bench_effects, repeats)),
+        (('metering_8_decks', 'meter_read_3_blocks'), partial(bench_metering, repeats)),
+        (('render_realtime_8_decks',), partial(bench_realtime, long_file, 8, 3 if quick else 10)),
+        (('update_round_trip',), partial(bench_update_round_trip, repeats)),
+        (('update_burst_4000',), partial(bench_update_burst, repeats)),
+        (('waveform_full_redraw', 'waveform_blit_frame', 'waveform_scroll_with_grid'), partial(bench_waveform, long_file, repeats)),
+        (('scrolling_frame_8_decks_short', 'scrolling_frame_8_decks_long', 'scrolling_zoom_8_decks'),
+         partial(bench_scrolling, repeats))
+    ]
+    for names, step in steps:
+        if only is not None and not only.intersection(names): #krok bez żadnego z wybranych wyników
+            continue
+        result = step()
+        named = result if 'median' not in result else {names[0]: result}
+        named = dict(filter(lambda item: only is None or item[0] in only, named.items()))
+        for key, value in named.items():
+            print(f"{key:24s} median {value['median'] * 1000:9.2f} ms   min {value['min'] * 1000:9.2f} ms"
+                  + (f"   underruns {value['underruns']}   overruns {value['overruns']}" if 'underruns' in value else ""))
+        results.update(named)
+    return results
+
+
+def host_description() -> dict: #maszyna, na której powstał pomiar - baseline z innego sprzętu niczego nie dowodzi
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next(filter(lambda line: line.startswith('model name'), f), '').split(':', 1)[-1].strip() or cpu
+    except OSError:
+        pass
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        memory = None
+    return {'machine': platform.machine(), 'cpu': cpu, 'cpu_count': os.cpu_count(), 'memory_bytes': memory,
+            'system': platform.system()}
+
+
+def same_host(baseline, host) -> bool: #procesor, liczba rdzeni i pamięć - nazwa maszyny może się różnić
+    recorded = baseline.get('meta', {}).get('host')
+    keys = ('machine', 'cpu', 'cpu_count', 'memory_bytes')
+    return recorded is not None and all(map(lambda key: recorded.get(key) == host.get(key), keys))
+
+
+def compare(results, baseline, threshold) -> list: #wolniej niż baseline * (1 + próg) -> regresja
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is not None and value['median'] > reference * (1 + threshold):
+            regressions.append({'name': name, 'median': value['median'], 'baseline': reference,
+                                'ratio': value['median'] / reference})
+        if value.get('underruns'): #przerwa w dźwięku jest błędem niezależnie od baseline
+            regressions.append({'name': name, 'median': value['median'], 'baseline': value['median'],
+                                'ratio': 1.0, 'underruns': value['underruns']})
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarki ładowania, analizy, renderowania i aktualizacji gui")
+    parser.add_argument('--quick', action='store_true', help="krótszy plik syntetyczny i mniej powtórzeń")
+    parser.add_argument('--output', default=None, help="zapis wyników do pliku JSON")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="plik baseline do porównania")
+    parser.add_argument('--threshold', type=float, default=None, help="dopuszczalne spowolnienie (0.25 = 25%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="zapisz bieżące wyniki jako baseline")
+    parser.add_argument('--only', default=None,
+                        help="tylko te wyniki, po przecinku; z --update-baseline dopisuje je do baseline z tej samej maszyny")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+    only = set(filter(None, map(str.strip, args.only.split(',')))) if args.only else None
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_all(workdir, quick=args.quick, only=only)
+    if only is not None and only - set(results): #literówka w nazwie nie może po cichu zostawić starego wpisu
+        print(f"Unknown benchmarks: {', '.join(sorted(only - set(results)))}")
+        sys.exit(2)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    threshold = args.threshold if args.threshold is not None else baseline.get('threshold', 0.25)
+    host = host_description()
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'host': host,
+            'quick': args.quick
+        },
+        'threshold': threshold,
+        'results': results,
+        'regressions': []
+    }
+    if baseline and baseline.get('quick') != args.quick: #inny rozmiar pliku syntetycznego - porównanie nie ma sensu
+        print(f"Baseline was recorded with quick={baseline.get('quick')}, skipping comparison")
+    elif baseline and not same_host(baseline, host): #np. 1 rdzeń vs wiele - pomiary wielowątkowe są nieporównywalne
+        print(f"Baseline was recorded on another host ({baseline.get('meta', {}).get('host')}), skipping comparison")
+    elif not args.update_baseline:
+        report['regressions'] = compare(results, baseline, threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        #--only dopisuje do baseline z tej samej maszyny i trybu; inaczej stare wpisy wypadają - nie mieszamy sprzętu
+        keep = only is not None and baseline.get('quick') == args.quick and same_host(baseline, host)
+        if only is not None and baseline and not keep:
+            print("Baseline comes from another host or mode, previous entries dropped")
+        recorded = dict(baseline.get('recorded', {})) if keep else {}
+        recorded.update(dict.fromkeys(results, report['meta']['timestamp']))
+        measured = dict(baseline.get('results', {})) if keep else {}
+        measured.update({name: value['median'] for name, value in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump({'threshold': threshold, 'quick': args.quick, 'meta': report['meta'], 'recorded': recorded,
+                       'results': measured}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    for regression in report['regressions']:
+        print(f"REGRESSION {regression['name']}: {regression['median'] * 1000:.2f} ms "
+              f"vs baseline {regression['baseline'] * 1000:.2f} ms ({regression['ratio']:.2f}x)")
+    sys.exit(1 if report['regressions'] else 0)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+
+ANALYSIS_VERSION = 2 #podbić przy każdej zmianie algorytmu analizy - stare wpisy przestaną pasować
+
+
+def file_hash(filename: str) -> str: #hash zawartości - klucz cache; liczony też w procesach batch_analyze
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as f:
+        for chunk in iter(partial(f.read, 1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache: #trwały cache wyników analizy (bpm, beaty, waveform) na dysku, klucz = hash zawartości pliku
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.functional_mixer', 'analysis_cache')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._hashes = {} #(ścieżka, rozmiar, mtime) -> hash, żeby nie czytać pliku dwa razy w jednej sesji
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries = OrderedDict() #ścieżka -> rozmiar, od najdawniej używanego - katalog czytany raz, dalej tylko w pamięci
+        self._versions = {} #(hash, rodzaj) -> ścieżki wpisów; inne parametry/wersja analizy = wpis do usunięcia
+        self._total = 0
+        self._load_index()
+
+    def _load_index(self): #kolejność LRU z mtime (get ustawia je przy każdym użyciu)
+        try:
+            with os.scandir(self.cache_dir) as it:
+                entries = sorted(map(lambda e: (e.stat().st_mtime, e.stat().st_size, e.path),
+                                     filter(lambda e: e.name.endswith('.npz'), it)))
+        except OSError as e:
+            print(f"Error indexing analysis cache: {e}")
+            entries = []
+        with self.lock:
+            for _, size, path in entries:
+                self._index(path, size)
+
+    def _index(self, path: str, size: int): #wołane z self.lock
+        self._total += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+        self._versions.setdefault(self._version_key(path), set()).add(path)
+
+    def _unindex(self, path: str): #wołane z self.lock
+        self._total -= self._entries.pop(path, 0)
+        paths = self._versions.get(self._version_key(path), set())
+        paths.discard(path)
+        if not paths:
+            self._versions.pop(self._version_key(path), None)
+
+    @staticmethod
+    def _version_key(path: str) -> tuple: #'hash-rodzaj-parametry.npz' -> (hash, rodzaj)
+        content_hash, kind, _ = os.path.basename(path)[:-len('.npz')].split('-', 2)
+        return content_hash, kind
+
+    def content_hash(self, filename: str) -> str:
+        stat = os.stat(filename)
+        memo_key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if memo_key in self._hashes:
+                return self._hashes[memo_key]
+        content_hash = file_hash(filename)
+        with self.lock:
+            self._hashes[memo_key] = content_hash
+        return content_hash
+
+    def _params_key(self, params: dict) -> str: #wersja + parametry analizy -> zmiana czegokolwiek unieważnia wpis
+        payload = json.dumps({'version': ANALYSIS_VERSION, **params}, sort_keys=True).encode()
+        return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+    def _entry_path(self, content_hash: str, kind: str, params: dict) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}-{kind}-{self._params_key(params)}.npz")
+
+    def get(self, filename: str, kind: str, params: dict):
+        try:
+            path = self._entry_path(self.content_hash(filename), kind, params)
+            with np.load(path, allow_pickle=False) as entry:
+                result = {name: entry[name] for name in entry.files}
+            os.utime(path) #mtime = czas ostatniego użycia - kolejność LRU po restarcie
+            with self.lock:
+                if path in self._entries:
+                    self._entries.move_to_end(path)
+                else: #wpis innego procesu (np. batch_analyze w tym samym czasie)
+                    self._index(path, os.path.getsize(path))
+            self.hits += 1
+            return result
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            print(f"Error reading analysis cache: {e}")
+            self.misses += 1
+            return None
+
+    def put(self, filename: str, kind: str, params: dict, arrays: dict, content_hash=None): #hash policzony wcześniej - bez czytania pliku
+        try:
+            path = self._entry_path(content_hash or self.content_hash(filename), kind, params)
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir) #własny plik każdego zapisu - równoległe put tego samego wpisu się nie mieszają
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path) #atomowa podmiana - inny wątek nie zobaczy połowy pliku
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            with self.lock:
+                self._index(path, os.path.getsize(path))
+                stale = list(self._versions[self._version_key(path)] - {path})
+                list(map(self._unindex, stale))
+                stale += self._evict()
+            list(map(self._remove, stale))
+        except Exception as e:
+            print(f"Error writing analysis cache: {e}")
+
+    def _evict(self) -> list: #wołane z self.lock; najdawniej używane wpisy ponad limit - pliki usuwa wołający, już bez locka
+        evicted = []
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path = next(iter(self._entries))
+            self._unindex(path)
+            evicted.append(path)
+        return evicted
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+PRIORITY_DECK = 0 #plik ładowany właśnie na deck
+PRIORITY_BACKGROUND = 1 #analiza w tle (np. przygotowanie kolejnych utworów)
+BACKGROUND_TOKEN = (None, 0) #token zadań niezwiązanych z deckiem - nigdy nie jest anulowany
+
+_generations = None #w procesie roboczym: współdzielona tablica aktualnych generacji decków
+_progress = None #w procesie roboczym: kolejka wstępnych wyników do procesu gui
+_processor = None
+
+
+def _init_worker(generations, progress):
+    global _generations, _progress
+    _generations = generations
+    _progress = progress
+
+
+def is_cancelled(token) -> bool: #deck dostał nowy plik -> zadanie ze starym tokenem jest nieaktualne
+    deck, generation = token
+    return deck is not None and _generations[deck] != generation
+
+
+def _report_progress(job_id, bpm, confidence):
+    _progress.put((job_id, bpm, confidence))
+
+
+def _run_bpm_job(filename, token, job_id): #wykonywane w osobnym procesie - bez GIL-a gui i odtwarzania
+    global _processor
+    if is_cancelled(token):
+        return None
+    if _processor is None:
+        from audio_processor import AudioProcessor
+        _processor = AudioProcessor()
+    return _processor.calculate_bpm_advanced(filename, should_cancel=partial(is_cancelled, token),
+                                             on_progress=partial(_report_progress, job_id))
+
+
+def _warm_worker(sample_rate=22050, seconds=8.0): #pierwsza analiza w procesie: import librosa.beat + kompilacja numba (~5 s)
+    global _processor
+    started = time.perf_counter()
+    import numpy as np
+    from tempo_estimator import TempoEstimator
+    if _processor is None:
+        from audio_processor import AudioProcessor
+        _processor = AudioProcessor()
+    clicks = np.zeros(int(sample_rate * seconds), dtype=np.float32) #syntetyczne kliknięcia 120 bpm - beat_track ma co liczyć
+    clicks[::sample_rate // 2] = 1.0
+    estimator = TempoEstimator(sample_rate)
+    estimator.feed(clicks)
+    estimator.finish()
+    return os.getpid(), time.perf_counter() - started
+
+
+class AnalysisPool: #pula procesów do analizy bpm z priorytetami i anulowaniem po zmianie pliku na decku
+    def __init__(self, num_decks=2, max_workers=None):
+        context = multiprocessing.get_context('spawn')
+        self.generations = context.Array('i', num_decks)
+        self.progress = context.Queue()
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                            initializer=_init_worker, initargs=(self.generations, self.progress))
+        self.lock = threading.Lock()
+        self._pending = [] #kopiec (priorytet, kolejność, zadanie) - do procesów trafia najwyżej max_workers naraz
+        self._counter = itertools.count()
+        self._running = 0
+        self._jobs = {} #id zadania -> zadanie; wstępne wyniki trafiają do on_progress właściwego zadania
+        self.cancelled = 0
+        self.progress_thread = threading.Thread(target=self._progress_loop, daemon=True, name="AnalysisProgress")
+        self.progress_thread.start()
+
+    def new_token(self, deck: int) -> tuple: #nowy plik na decku unieważnia wszystkie jego starsze zadania
+        with self.generations.get_lock():
+            self.generations[deck] += 1
+            return deck, self.generations[deck]
+
+    def is_current(self, token) -> bool:
+        deck, generation = token
+        return deck is None or self.generations[deck] == generation
+
+    def submit_bpm(self, filename, token, callback, priority=PRIORITY_DECK, on_progress=None, hold=None): #callback(wynik) woła wątek puli, nie gui
+        #on_progress(bpm, pewność) - wstępne wyniki w trakcie analizy; hold - źródło trzymane do końca zadania (jego plik pcm)
+        job = {'id': next(self._counter), 'filename': filename, 'token': token, 'callback': callback,
+               'on_progress': on_progress, 'hold': hold}
+        with self.lock:
+            heapq.heappush(self._pending, (priority, job['id'], job))
+        self._dispatch()
+
+    def _dispatch(self):
+        started, failed = [], []
+        with self.lock:
+            while self._running < self.max_workers and self._pending:
+                _, _, job = heapq.heappop(self._pending)
+                if not self.is_current(job['token']): #nieaktualne zadanie wypada z kolejki zanim zajmie proces
+                    self.cancelled += 1
+                    continue
+                try:
+                    future = self.executor.submit(_run_bpm_job, job['filename'], job['token'], job['id'])
+                except (BrokenProcessPool, RuntimeError) as e: #pula po shutdown albo po śmierci procesu roboczego
+                    print(f"Error submitting BPM analysis: {e}")
+                    failed.append(job)
+                    continue
+                self._jobs[job['id']] = job
+                self._running += 1
+                started.append((job, future))
+        #callbacki dopiero bez locka - zakończone już zadanie woła _on_done od razu, w tym wątku
+        list(map(lambda item: item[1].add_done_callback(partial(self._on_done, item[0])), started))
+        list(map(lambda job: job['callback'](None), failed))
+
+    def warm_up(self, on_done=None): #rozgrzewka procesów w tle po starcie; on_done(pid, sekundy) z wątku puli
+        with self.lock:
+            self._running += self.max_workers #prawdziwe zadania czekają w kopcu i trafiają już do rozgrzanych procesów
+        for _ in range(self.max_workers):
+            try:
+                future = self.executor.submit(_warm_worker)
+            except (BrokenProcessPool, RuntimeError) as e:
+                print(f"Error warming up analysis process: {e}")
+                with self.lock:
+                    self._running -= 1
+                continue
+            future.add_done_callback(partial(self._on_warm, on_done))
+
+    def _on_warm(self, on_done, future):
+        with self.lock:
+            self._running -= 1
+        self._dispatch()
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error warming up analysis process: {e}")
+            return
+        if on_done is not None:
+            on_done(*result)
+
+    def _on_done(self, job, future):
+        with self.lock:
+            self._running -= 1
+            self._jobs.pop(job['id'], None)
+            job.pop('hold', None) #future żyje jeszcze w wątku puli - źródło (i jego plik pcm) zwalniamy od razu
+            stale = future.cancelled() or not self.is_current(job['token'])
+            self.cancelled += stale
+        self._dispatch()
+        if stale:
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error in BPM analysis process: {e}")
+            result = None
+        job['callback'](result) #None - analiza się nie udała
+
+    def _progress_loop(self): #wstępne bpm z procesów roboczych; None - koniec pracy
+        while True:
+            message = self.progress.get()
+            if message is None:
+                return
+            job_id, bpm, confidence = message
+            with self.lock:
+                job = self._jobs.get(job_id)
+            if job is not None and job['on_progress'] is not None and self.is_current(job['token']):
+                job['on_progress'](bpm, confidence)
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def shutdown(self):
+        with self.lock:
+            self._pending.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.progress.put(None)
@@ -1,12 +1,18 @@
 import numpy as np
 from functools import reduce, partial
 from typing import Callable, Dict, Any
-import librosa
-import pygame
+from peak_pyramid import PeakPyramid
+from deck_source import sample_scale, open_source, ArraySource
+from tempo_estimator import TempoEstimator
 
 class AudioProcessor: #tworzy słownik fukcji przetwarzających dzwięk i oblicza bpm
     def __init__(self): 
         self.processors = self._create_audio_processors()
+        self.bpm_params = {'analysis_rate': 11025, 'n_fft': 1024, 'hop_length': 256, 'window_seconds': 12.0,
+                           'min_beat_time': 0.5} #parametry analizy - wchodzą do klucza cache
+        self.first_estimate_seconds = 6.0 #po tylu sekundach audio pierwszy, wstępny bpm
+        self.progress_interval = 15.0 #potem doprecyzowanie co tyle sekund audio
+        self.waveform_params = {'base_block': 256, 'max_base_blocks': 2 ** 19}
 
     def _create_audio_processors(self) -> Dict[str, Callable]: #słownik z lambdami które przetwarzaja
         return {                                               #dzwięk, tylko utworzenie
@@ -14,28 +20,70 @@ class AudioProcessor: #tworzy słownik fukcji przetwarzających dzwięk i oblicz
             'to_float': lambda x: x.astype(np.float32),
             'downsample': lambda x, factor: x[::max(1, len(x) // factor)],
             'to_mono': lambda x: reduce(np.add, x.T) / x.shape[1] if len(x.shape) > 1 else x,
-            'apply_volume': lambda x, vol: x * vol
+            'apply_volume': lambda x, vol: x * vol,
+            'peak_pyramid': lambda x, sample_rate, base_block, max_base_blocks: PeakPyramid.from_signal(
+                x, sample_rate, base_block, max_base_blocks),
+            'to_mono_float': self._to_mono_float, #konwersja + mono w jednym kroku na bloku surowych próbek
+            'block_envelope': self._block_envelope
         }
 
-    def process_audio(self, sound, factor=20000): #modyfikacja załadowanej przez nas ścieżki
-        raw_data = pygame.sndarray.array(sound)   #na podstawie tych funkcji z słownika
-        processing_pipeline = [
-            self.processors['to_float'], # tutaj mamy pipeline - funckje wykonują sie po kolei
-            self.processors['to_mono'],
-            self.processors['normalize'],
-            partial(self.processors['downsample'], factor=factor) #partial - factor jest wartościa przypisana na stale
+    @staticmethod
+    def _to_mono_float(x: np.ndarray) -> np.ndarray: #średnia kanałów liczona od razu w float32, bez kopii stereo
+        mono = x.mean(axis=1, dtype=np.float32) if x.ndim > 1 else x.astype(np.float32)
+        if x.dtype.kind == 'u':
+            mono -= 128.0
+        scale = sample_scale(x.dtype)
+        if scale != 1.0:
+            mono *= np.float32(1.0 / scale)
+        return mono
+
+    @staticmethod
+    def _block_envelope(x: np.ndarray, base_block: int) -> np.ndarray: #blok mono -> wiersze (min, max, średni kwadrat)
+        padding = -len(x) % base_block
+        if padding:
+            x = np.concatenate([x, np.zeros(padding, dtype=np.float32)])
+        blocks = x.reshape(-1, base_block)
+        return np.stack([blocks.min(axis=1), blocks.max(axis=1), np.einsum('ij,ij->i', blocks, blocks) / base_block], axis=1)
+
+    def process_audio(self, source) -> PeakPyramid: #obwiednia liczona blokami wprost z widoku próbek źródła (DeckSource)
+        base_block = PeakPyramid.pick_base_block(source.frames, **self.waveform_params)
+        block_frames = base_block * max(1, (1 << 18) // base_block) #~6 s audio - szczytowa pamięć to jeden blok, nie cały utwór
+        block_pipeline = [
+            self.processors['to_mono_float'], # tutaj mamy pipeline - funckje wykonują sie po kolei na każdym bloku
+            partial(self.processors['block_envelope'], base_block=base_block) #partial - base_block jest wartościa przypisana na stale
         ]
-        return reduce(lambda data, func: func(data), processing_pipeline, raw_data) #reduce - zmieniamy wsztko w jeden ciąg
+        envelopes = map(lambda block: reduce(lambda data, func: func(data), block_pipeline, block), #reduce - zmieniamy wsztko w jeden ciąg
+                        source.raw_blocks(block_frames))
+        level0 = np.concatenate([np.zeros((0, 3), dtype=np.float32), *envelopes])
+        return PeakPyramid.from_base_level(level0, base_block, source.sample_rate, source.frames) #normalizacja na samej obwiedni
+
+    def _analysis_blocks(self, filename: str, block_frames: int): #(sample rate, bloki surowych próbek) - bez wczytywania całości
+        try:
+            source = open_source(filename, 44100)
+        except Exception: #format bez strumienia, a w procesie roboczym nie ma miksera pygame - dekodujemy w całości
+            import librosa
+            y, sr = librosa.load(filename, sr=None, mono=True)
+            source = ArraySource(y, sr)
+        return source.sample_rate, source.raw_blocks(block_frames)
 
-    def calculate_bpm_advanced(self, filename: str) -> tuple[any, list, float]: #wyliczenie bpm na podstawie funkcjiz librosa
+    def calculate_bpm_advanced(self, filename: str, should_cancel=None, on_progress=None) -> tuple[any, list, float]: #bpm liczony strumieniowo z całego utworu
         try:
-            y, sr = librosa.load(filename, duration=60)
-            tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr, hop_length=1024)
-            tempo_scalar = float(tempo.item() if hasattr(tempo, 'item') else tempo)
-            confidence = 0.8
-            beat_times = librosa.frames_to_time(beat_frames, sr=sr, hop_length=1024) #podział pliku na ramki czasowe odpowiadające jednemu uderzeniu
-            filtered_beats = list(filter(lambda t: 0.5 <= t, beat_times))
-            return round(tempo_scalar, 1), filtered_beats, round(confidence, 2) #zwracamy bpm , te ramki(podziały czasowe) i wartość confidence
+            sample_rate, blocks = self._analysis_blocks(filename, 1 << 16)
+            estimator_params = dict(filter(lambda item: item[0] != 'min_beat_time', self.bpm_params.items()))
+            estimator = TempoEstimator(sample_rate, **estimator_params)
+            next_report = self.first_estimate_seconds
+            for block in blocks:
+                if should_cancel is not None and should_cancel(): #deck dostał już inny plik - szkoda liczyć dalej
+                    return None, [], 0.0
+                estimator.feed(self.processors['to_mono_float'](block))
+                if on_progress is not None and estimator.seconds >= next_report: #wstępny wynik zanim skończymy plik
+                    bpm, confidence = estimator.provisional()
+                    if bpm:
+                        on_progress(bpm, confidence)
+                    next_report = estimator.seconds + self.progress_interval
+            result = estimator.finish() #bpm dominującego odcinka, beaty liczone osobno w każdym odcinku tempa
+            filtered_beats = list(filter(lambda t: self.bpm_params['min_beat_time'] <= t, result['beats']))
+            return result['bpm'], filtered_beats, result['confidence'] #pewność z wyrazistości pulsu i stabilności tempa
         except Exception as e:
             print(f"Error in BPM calculation: {e}")
             return None, [], 0.0
@@ -1,27 +1,59 @@
-from typing import Dict, Any, List
-
-class AudioState:
-    def __init__(self):
-        self.state = self._initialize_audio_state()
-        self.state_lock = None 
-
-    def _initialize_audio_state(self) -> Dict[str, Any]: #utworzenie słownika danych ścieżek audio dla apki 
-        return {
-            'files': [None, None],
-            'filenames': [None, None],
-            'data': [None, None],
-            'durations': [0, 0],
-            'channels': [None, None],
-            'playing': [False, False],
-            'paused': [False, False],
-            'pause_positions': [0, 0],
-            'start_times': [0, 0],
-            'current_positions': [0, 0],
-            'volumes': [0.5, 0.5],
-            'bpm_values': [None, None],
-            'beat_times': [[], []],
-            'tempo_confidence': [0.0, 0.0],
-            'waveform_cache': [None, None],
-            'bpm_analyzing': [False, False],
-            'time_axes': [None, None]
-        }
+import threading
+from typing import Tuple
+
+
+class DeckState: #stan jednego decka - niezmienny; zmiana = nowy obiekt (copy-on-write), czytelnik nigdy nie widzi połowy zapisu
+    __slots__ = ('source', 'filename', 'waveform', 'duration', 'playing', 'paused', 'pause_position',
+                 'current_position', 'volume', 'bpm', 'beat_times', 'confidence', 'analyzing', 'tempo')
+
+    DEFAULTS = {
+        'source': None, #DeckSource odtwarzanego pliku
+        'filename': None,
+        'waveform': None, #PeakPyramid - obwiednia do rysowania w dowolnym zoomie
+        'duration': 0.0,
+        'playing': False,
+        'paused': False,
+        'pause_position': 0, #w ramkach - wznowienie co do próbki
+        'current_position': 0.0, #sekundy utworu
+        'volume': 0.5,
+        'bpm': None,
+        'beat_times': (),
+        'confidence': 0.0,
+        'analyzing': False,
+        'tempo': 1.0 #mnożnik tempa po synchronizacji (1.0 - oryginalne)
+    }
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name, self.DEFAULTS[name]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DeckState is immutable - use AudioState.update()")
+
+    def replace(self, **changes) -> 'DeckState':
+        return DeckState(**{**dict(map(lambda name: (name, getattr(self, name)), self.__slots__)), **changes})
+
+
+class AudioState: #opublikowana krotka stanów decków - czytanie bez locka, zapis przez podmianę całej krotki
+    def __init__(self, num_decks=2, lock=None):
+        self.decks: Tuple[DeckState, ...] = tuple(map(lambda _: DeckState(), range(num_decks)))
+        self.write_lock = lock if lock is not None else threading.Lock() #tylko między piszącymi, trzymany na czas podmiany
+
+    def snapshot(self) -> Tuple[DeckState, ...]: #spójny obraz wszystkich decków naraz
+        return self.decks
+
+    def deck(self, index: int) -> DeckState:
+        return self.decks[index]
+
+    def update(self, index: int, when=None, **changes) -> bool: #when(deck) - zapis tylko gdy warunek wciąż prawdziwy
+        with self.write_lock:
+            deck = self.decks[index]
+            if when is not None and not when(deck):
+                return False
+            decks = list(self.decks)
+            decks[index] = deck.replace(**changes)
+            self.decks = tuple(decks) #przypisanie referencji jest atomowe - czytelnik ma starą albo nową krotkę
+        return True
+
+    def any_playing(self) -> bool:
+        return any(map(lambda deck: deck.playing, self.decks))
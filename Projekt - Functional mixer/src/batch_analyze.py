@@ -0,0 +1,222 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from analysis_cache import ANALYSIS_VERSION, file_hash
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac', '.m4a')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    analysis_key TEXT NOT NULL,
+    duration REAL,
+    sample_rate INTEGER,
+    bpm REAL,
+    confidence REAL,
+    beat_times BLOB,
+    envelope BLOB,
+    envelope_base_block INTEGER,
+    analyzed_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tracks_bpm ON tracks (bpm);
+"""
+
+_processor = None #w procesie roboczym - tworzony raz na proces
+
+
+def analysis_key(processor) -> str: #wersja + parametry - zmiana unieważnia wpisy w indeksie
+    params = {'version': ANALYSIS_VERSION, 'bpm': processor.bpm_params, 'waveform': processor.waveform_params}
+    return hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def find_audio_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.abspath(path)
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(filter(lambda n: n.lower().endswith(AUDIO_EXTENSIONS), files)):
+                yield os.path.abspath(os.path.join(root, name))
+
+
+def _analyze_file(path, with_hash=False): #wykonywane w procesie roboczym: bpm + obwiednia, wynik gotowy do zapisu w indeksie
+    global _processor
+    if _processor is None:
+        from audio_processor import AudioProcessor
+        _processor = AudioProcessor()
+    from deck_source import open_source, pcm_path, new_decode_dir
+    started = time.perf_counter()
+    decode_dir = new_decode_dir('batch_pcm') #skompresowany plik dekodowany raz - obwiednia i bpm z tego samego pcm
+    try:
+        source = open_source(path, 44100, decode_dir)
+        pyramid = _processor.process_audio(source)
+        bpm, beats, confidence = _processor.calculate_bpm_advanced(pcm_path(source, path))
+        arrays = pyramid.to_arrays()
+        return {
+            'path': path,
+            'duration': source.frames / source.sample_rate,
+            'sample_rate': source.sample_rate,
+            'bpm': bpm,
+            'confidence': confidence,
+            'beat_times': np.asarray(beats, dtype=np.float64).tobytes(),
+            'envelope': arrays['level0'].astype(np.float32).tobytes(),
+            'envelope_base_block': pyramid.base_block,
+            'error': None if bpm is not None else "BPM analysis failed",
+            'content_hash': file_hash(path) if with_hash else None, #klucz cache gui - główny proces nie czyta pliku drugi raz
+            'elapsed': time.perf_counter() - started
+        }
+    except Exception as e:
+        return {'path': path, 'error': str(e), 'elapsed': time.perf_counter() - started}
+    finally:
+        shutil.rmtree(decode_dir, ignore_errors=True)
+
+
+class BatchAnalyzer: #analiza całej biblioteki bez gui, na wszystkich rdzeniach, z indeksem w SQLite
+    def __init__(self, index_path, workers=None, report_interval=2.0, fill_cache=False):
+        from audio_processor import AudioProcessor
+        self.connection = sqlite3.connect(index_path)
+        self.connection.executescript(SCHEMA)
+        self.workers = workers or os.cpu_count() or 1
+        self.report_interval = report_interval
+        self.analysis_key = analysis_key(AudioProcessor())
+        self.cache = None
+        if fill_cache: #wyniki od razu trafiają też do cache gui - załadowanie utworu w mikserze jest natychmiastowe
+            from analysis_cache import AnalysisCache
+            self.cache = AnalysisCache()
+            self.processor = AudioProcessor()
+
+    def _is_unchanged(self, path, stat) -> bool:
+        row = self.connection.execute("SELECT size, mtime_ns, analysis_key, error FROM tracks WHERE path = ?",
+                                      (path,)).fetchone()
+        return row is not None and row[:3] == (stat.st_size, stat.st_mtime_ns, self.analysis_key) and row[3] is None
+
+    def pending_files(self, paths):
+        for path in find_audio_files(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if not self._is_unchanged(path, stat):
+                yield path, stat
+
+    def run(self, paths) -> dict: #pliki prosto z generatora - skanowanie biblioteki idzie razem z analizą
+        stats = {'total': 0, 'done': 0, 'errors': 0, 'crashes': 0, 'audio_seconds': 0.0, 'scanning': True,
+                 'started': time.perf_counter()}
+        print(f"Analyzing with {self.workers} workers")
+        from deck_source import clean_stale_decode_dirs
+        clean_stale_decode_dirs() #pcm procesów roboczych z przerwanego wcześniej przebiegu
+        queue = self.pending_files(paths)
+        last_report = time.perf_counter()
+        executor = self._new_pool()
+        running = {} #future -> (ścieżka, stat)
+        try:
+            while True:
+                while stats['scanning'] and len(running) < self.workers * 2: #okno zadań - nie wrzucamy dziesiątek tysięcy futures naraz
+                    item = next(queue, None)
+                    if item is None:
+                        stats['scanning'] = False
+                        break
+                    stats['total'] += 1
+                    running[executor.submit(_analyze_file, item[0], self.cache is not None)] = item
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                if any(list(map(lambda future: self._collect(future, running.pop(future), stats), done))):
+                    #proces roboczy padł - pula nie przyjmie nowych zadań, a pozostałe zadania tej puli kończą się błędem
+                    rest = wait(list(running)).done
+                    list(map(lambda future: self._collect(future, running.pop(future), stats), rest))
+                    executor.shutdown(wait=False)
+                    executor = self._new_pool()
+                    stats['crashes'] += 1
+                self.connection.commit() #po każdej partii - przerwana analiza wznowi się od miejsca przerwania
+                if time.perf_counter() - last_report >= self.report_interval:
+                    self._report(stats)
+                    last_report = time.perf_counter()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._report(stats)
+        return stats
+
+    def _new_pool(self): #spawn - nowa pula po awarii nie dziedziczy locków z wątków starej (fork potrafił się zawiesić)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _collect(self, future, item, stats) -> bool: #zapis wyniku jednego zadania; True - proces roboczy padł
+        path, stat = item
+        try:
+            result, broken = future.result(), False
+        except BrokenProcessPool: #plik do ponownej analizy przy następnym uruchomieniu - wpisy z błędem nie są aktualne
+            result, broken = {'path': path, 'error': "Analysis worker crashed", 'elapsed': 0.0}, True
+        self._store(result, stat)
+        stats['done'] += 1
+        stats['errors'] += result['error'] is not None
+        stats['audio_seconds'] += result.get('duration', 0.0)
+        return broken
+
+    def _store(self, result, stat):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO tracks (path, size, mtime_ns, analysis_key, duration, sample_rate, bpm, confidence, "
+            "beat_times, envelope, envelope_base_block, analyzed_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (result['path'], stat.st_size, stat.st_mtime_ns, self.analysis_key, result.get('duration'),
+             result.get('sample_rate'), result.get('bpm'), result.get('confidence'), result.get('beat_times'),
+             result.get('envelope'), result.get('envelope_base_block'), time.time(), result['error']))
+        if self.cache is not None and result['error'] is None:
+            self._store_in_cache(result)
+
+    def _store_in_cache(self, result):
+        level0 = np.frombuffer(result['envelope'], dtype=np.float32).reshape(-1, 3)
+        frames = int(round(result['duration'] * result['sample_rate']))
+        self.cache.put(result['path'], 'waveform', self.processor.waveform_params, {
+            'level0': level0,
+            'meta': np.array([result['envelope_base_block'], result['sample_rate'], frames], dtype=np.int64)
+        }, content_hash=result['content_hash'])
+        self.cache.put(result['path'], 'bpm', self.processor.bpm_params, {
+            'bpm': np.float64(result['bpm']),
+            'beat_times': np.frombuffer(result['beat_times'], dtype=np.float64),
+            'confidence': np.float64(result['confidence'])
+        }, content_hash=result['content_hash'])
+
+    def _report(self, stats):
+        elapsed = max(time.perf_counter() - stats['started'], 1e-9)
+        rate = stats['done'] / elapsed
+        eta = (stats['total'] - stats['done']) / rate if rate > 0 else float('inf')
+        total = f"{stats['total']}+" if stats['scanning'] else stats['total'] #w trakcie skanowania liczba plików jeszcze rośnie
+        print(f"[{stats['done']}/{total}] {rate:.2f} files/s, "
+              f"{stats['audio_seconds'] / elapsed:.1f}x real time, errors: {stats['errors']}"
+              + (f", worker crashes: {stats['crashes']}" if stats['crashes'] else "")
+              + (", scanning..." if stats['scanning'] else f", ETA {eta:.0f} s"))
+
+    def query(self, min_bpm, max_bpm):
+        return self.connection.execute(
+            "SELECT path, bpm, confidence, duration FROM tracks WHERE error IS NULL AND bpm BETWEEN ? AND ? ORDER BY bpm",
+            (min_bpm, max_bpm)).fetchall()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analiza BPM i obwiedni całych katalogów bez gui")
+    parser.add_argument('paths', nargs='*', help="katalogi albo pliki audio")
+    parser.add_argument('--index', default='library.sqlite', help="plik indeksu SQLite")
+    parser.add_argument('--workers', type=int, default=None, help="liczba procesów (domyślnie wszystkie rdzenie)")
+    parser.add_argument('--fill-cache', action='store_true', help="zapisz wyniki także do cache analizy miksera")
+    parser.add_argument('--query', nargs=2, type=float, metavar=('MIN_BPM', 'MAX_BPM'),
+                        help="wypisz utwory z indeksu w zakresie BPM")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    analyzer = BatchAnalyzer(args.index, workers=args.workers, fill_cache=args.fill_cache)
+    if args.paths:
+        analyzer.run(args.paths)
+    if args.query:
+        for path, bpm, confidence, duration in analyzer.query(*args.query):
+            print(f"{bpm:6.1f} BPM  conf {confidence:.2f}  {duration:7.1f} s  {path}")
@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+from deck_source import open_source, pcm_path, decoded_bytes, StreamingDeck
+from peak_pyramid import PeakPyramid
+from analysis_pool import PRIORITY_BACKGROUND, BACKGROUND_TOKEN
+
+
+class PrefetchCache: #utwory "następne w kolejce" przygotowane w tle: pcm, obwiednia i bpm, z limitem pamięci
+    def __init__(self, app, max_bytes=1024 * 1024 * 1024):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() #filename -> wpis; kolejność = ostatnie użycie (LRU)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self, filename: str):
+        with self.lock:
+            if filename in self.entries:
+                self.entries.move_to_end(filename)
+                return
+            self.entries[filename] = {'ready': False, 'taken': False, 'source': None, 'stream': None, 'pyramid': None,
+                                      'analysis': None, 'nbytes': 0}
+        self.app.executor.submit(self._warm, filename)
+
+    def _warm(self, filename: str): #wątek puli: dekodowanie, obwiednia, bpm - wszystko zanim ktoś kliknie Browse
+        try:
+            engine, processor, cache = self.app.mixer_engine, self.app.audio_processor, self.app.analysis_cache
+            #pcm w pliku mapowanym (WAV albo wspólne dekodowanie) - strony w pamięci podręcznej systemu, nie w procesie
+            source = open_source(filename, engine.frequency, self.app.decode_dir)
+
+            cached = cache.get(filename, 'waveform', processor.waveform_params)
+            if cached is not None:
+                pyramid = PeakPyramid.from_arrays(cached)
+            else:
+                pyramid = processor.process_audio(source)
+                cache.put(filename, 'waveform', processor.waveform_params, pyramid.to_arrays())
+
+            stream = StreamingDeck(source, engine.frequency)
+            while stream.fill(): #bufor przed głowicą pełny jeszcze przed załadowaniem na deck
+                pass
+
+            with self.lock:
+                entry = self.entries.get(filename)
+                if entry is None: #usunięty w trakcie
+                    return
+                entry.update(source=source, stream=stream, pyramid=pyramid, ready=True)
+                self._evict()
+
+            bpm_cached = cache.get(filename, 'bpm', processor.bpm_params)
+            if bpm_cached is not None:
+                self._set_analysis(filename, (float(bpm_cached['bpm']), list(bpm_cached['beat_times']),
+                                              float(bpm_cached['confidence'])))
+            else:
+                self.app.analysis_pool.submit_bpm(pcm_path(source, filename), BACKGROUND_TOKEN, partial(self._on_analyzed, filename),
+                                                  priority=PRIORITY_BACKGROUND, hold=source)
+        except Exception as e:
+            print(f"Error prefetching {filename}: {e}")
+            with self.lock:
+                self.entries.pop(filename, None)
+        self.app.utils.post_update('prefetch_update', None)
+
+    def _on_analyzed(self, filename, result):
+        if result is None or result[0] is None:
+            return
+        bpm, beats, confidence = result
+        self.app.analysis_cache.put(filename, 'bpm', self.app.audio_processor.bpm_params, {
+            'bpm': np.float64(bpm),
+            'beat_times': np.asarray(beats, dtype=np.float64),
+            'confidence': np.float64(confidence)
+        })
+        self._set_analysis(filename, result)
+
+    def _set_analysis(self, filename, result):
+        with self.lock:
+            if filename in self.entries:
+                self.entries[filename]['analysis'] = result
+        self.app.utils.post_update('prefetch_update', None)
+
+    def _measure(self, entry) -> int: #wywoływane z self.lock; faktycznie wypełnione ramki, nie rozmiar mapowania ani bufora
+        if not entry['ready'] or entry['taken']: #oddany na deck - jego pamięć liczy już deck, nie prefetch
+            return 0
+        stream_bytes = entry['stream'].buffered() * entry['stream'].ring[0].nbytes if entry['stream'] is not None else 0
+        return entry['pyramid'].nbytes() + stream_bytes + decoded_bytes(entry['source'])
+
+    def _evict(self): #wywoływane z self.lock - najpierw najdawniej używane
+        for entry in self.entries.values(): #wspólne pcm dekoduje się dalej w tle - rozmiar przeliczany przy każdym sprawdzeniu
+            entry['nbytes'] = self._measure(entry)
+        total = sum(map(lambda entry: entry['nbytes'], self.entries.values()))
+        while total > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            total -= evicted['nbytes']
+
+    def take(self, filename: str): #gotowy wpis dla decka albo None; strumień oddajemy tylko raz
+        with self.lock:
+            entry = self.entries.get(filename)
+            if entry is None or not entry['ready']:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(filename)
+            result = dict(entry)
+            entry['stream'] = None
+            entry['taken'] = True
+            entry['nbytes'] = 0
+            if result['stream'] is None:
+                result['stream'] = StreamingDeck(entry['source'], self.app.mixer_engine.frequency)
+            return result
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'ready': sum(map(lambda entry: entry['ready'], self.entries.values())),
+                'bytes': sum(map(self._measure, self.entries.values())),
+                'hits': self.hits,
+                'misses': self.misses
+            }
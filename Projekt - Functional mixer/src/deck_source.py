@@ -0,0 +1,457 @@
+import glob
+import hashlib
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import weakref
+from collections import deque
+import numpy as np
+import pygame
+
+try:
+    import soundfile
+except ImportError: #bez soundfile pliki inne niż WAV dekodujemy w całości przez pygame
+    soundfile = None
+
+SHARED_TMP = '/dev/shm' if os.path.isdir('/dev/shm') else None #tmpfs - wspólne pcm w pamięci współdzielonej, bez zapisu na dysk
+SHARED_HEADROOM = 0.1 #część tmpfs, która zostaje wolna dla innych programów - poniżej tego dekodujemy bez wspólnego pcm
+DECODE_DIR_PATTERN = re.compile(r'^(?:mixer|batch)_pcm_(?:(\d+)_)?') #pid właściciela w nazwie katalogu
+
+WAV_DTYPES = { #(kod formatu, bity) -> dtype próbek w pliku
+    (1, 8): np.dtype('u1'),
+    (1, 16): np.dtype('<i2'),
+    (1, 32): np.dtype('<i4'),
+    (3, 32): np.dtype('<f4'),
+    (3, 64): np.dtype('<f8')
+}
+
+
+def sample_scale(dtype) -> float: #dzielnik sprowadzający próbki danego typu do zakresu [-1, 1]
+    if dtype.kind == 'u':
+        return float(np.iinfo(dtype).max // 2 + 1)
+    if dtype.kind == 'i':
+        return float(np.iinfo(dtype).max + 1)
+    return 1.0
+
+
+def to_stereo_float(samples: np.ndarray) -> np.ndarray: #dowolne próbki (ramki, kanały) -> float32 (ramki, 2)
+    scale = sample_scale(samples.dtype)
+    if samples.dtype.kind == 'u':
+        samples = samples.astype(np.float32) - scale
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    stereo = samples[:, [0, 0]] if samples.shape[1] == 1 else samples[:, :2]
+    out = stereo.astype(np.float32)
+    if scale != 1.0:
+        out *= np.float32(1.0 / scale)
+    return out
+
+
+_pygame_lock = threading.Lock()
+
+
+def pygame_pcm(filename: str, sample_rate: int) -> np.ndarray: #formaty, których libsndfile nie czyta - całość przez pygame
+    with _pygame_lock: #mixer pygame startuje dopiero tutaj - na co dzień wyjście audio ma tylko MixerEngine
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=sample_rate, size=-16, channels=2)
+    return to_stereo_float(pygame.sndarray.array(pygame.mixer.Sound(filename)))
+
+
+class ArraySource: #całe pcm w pamięci - fallback gdy formatu nie da się czytać kawałkami
+    def __init__(self, pcm: np.ndarray, sample_rate: int):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.frames = len(pcm)
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        return self.pcm[start:start + frames]
+
+    def raw_blocks(self, block_frames: int): #widoki tylko do odczytu - bez kopiowania pcm
+        view = self.pcm.view()
+        view.flags.writeable = False
+        return map(lambda start: view[start:start + block_frames], range(0, self.frames, block_frames))
+
+
+class MemmapWavSource: #WAV czytany przez mapowanie pamięci - system ładuje tylko strony, które faktycznie czytamy
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError("not a RIFF/WAVE file")
+            fmt, data_offset, data_size = None, None, 0
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size + (chunk_size & 1))
+                elif chunk_id == b'data':
+                    data_offset, data_size = f.tell(), chunk_size
+                    break
+                else:
+                    f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+        if fmt is None or data_offset is None:
+            raise ValueError("missing fmt or data chunk")
+        audio_format, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+        if audio_format == 0xFFFE and len(fmt) >= 26: #WAVE_FORMAT_EXTENSIBLE - właściwy kod w subformacie
+            audio_format = struct.unpack('<H', fmt[24:26])[0]
+        dtype = WAV_DTYPES.get((audio_format, bits))
+        if dtype is None:
+            raise ValueError(f"unsupported WAV format {audio_format}/{bits} bit")
+        available = os.path.getsize(filename) - data_offset
+        self.frames = min(data_size, available) // block_align
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.filename = filename #plik do zmapowania w innym procesie (analiza) - te same strony w pamięci
+        self.samples = np.memmap(filename, dtype=dtype, mode='r', offset=data_offset, shape=(self.frames, channels))
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        return to_stereo_float(self.samples[start:start + frames])
+
+    def raw_blocks(self, block_frames: int): #surowe próbki z mapowania (tylko do odczytu), bez konwersji
+        return map(lambda start: self.samples[start:start + block_frames], range(0, self.frames, block_frames))
+
+
+class SoundFileSource: #inne formaty dekodowane kawałkami przez libsndfile, z seekiem
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = soundfile.SoundFile(filename)
+        self.frames = self.file.frames
+        self.sample_rate = self.file.samplerate
+        self.lock = threading.Lock()
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        with self.lock:
+            self.file.seek(start)
+            return to_stereo_float(self.file.read(frames, dtype='float32', always_2d=True))
+
+    def raw_blocks(self, block_frames: int): #osobny uchwyt pliku - nie przeszkadza wątkowi odtwarzania
+        return soundfile.blocks(self.filename, blocksize=block_frames, dtype='float32', always_2d=True)
+
+
+def wav_header(frames: int, channels: int, sample_rate: int) -> bytes: #nagłówek PCM 16 bit; frames=0 - plik jeszcze niegotowy
+    data_size = frames * channels * 2
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels, sample_rate,
+                       sample_rate * channels * 2, channels * 2, 16, b'data', data_size)
+
+
+def new_decode_dir(prefix: str) -> str: #katalog na wspólne pcm z pid w nazwie - po awarii procesu sprząta go następne uruchomienie
+    return tempfile.mkdtemp(prefix=f"{prefix}_{os.getpid()}_", dir=SHARED_TMP)
+
+
+def clean_stale_decode_dirs(): #katalogi pcm po procesach, które już nie żyją (awaria, kill) - inaczej tmpfs do restartu systemu
+    for path in glob.glob(os.path.join(SHARED_TMP or tempfile.gettempdir(), '*_pcm_*')):
+        match = DECODE_DIR_PATTERN.match(os.path.basename(path))
+        if match is None or not os.path.isdir(path):
+            continue
+        if match.group(1) is not None:
+            try:
+                os.kill(int(match.group(1)), 0)
+                continue #właściciel działa
+            except ProcessLookupError:
+                pass
+            except PermissionError: #proces innego użytkownika - żyje
+                continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def has_room(directory: str, size: int) -> bool: #plik pcm zmieści się w tmpfs z zapasem - pełny tmpfs przy zapisie przez memmap to SIGBUS
+    try:
+        usage = shutil.disk_usage(directory)
+    except OSError:
+        return False
+    return usage.free - size >= usage.total * SHARED_HEADROOM
+
+
+def _release_decoded(filename: str): #finalizer ostatniego źródła czytającego plik - plik znika z tmpfs
+    with SharedDecodeSource._active_lock:
+        count = SharedDecodeSource._users.pop(filename, 1) - 1
+        if count > 0:
+            SharedDecodeSource._users[filename] = count
+            return
+        try:
+            os.remove(filename) #procesy, które go już zmapowały, czytają dalej - tmpfs zwalnia strony po ostatnim munmap
+        except FileNotFoundError:
+            pass
+
+
+def decoded_bytes(source) -> int: #pcm już zdekodowane do pamięci: tablica albo wspólny plik w tmpfs (0 - czytane z pliku użytkownika)
+    if isinstance(source, ArraySource):
+        return source.pcm.nbytes
+    with SharedDecodeSource._active_lock:
+        if getattr(source, 'filename', None) not in SharedDecodeSource._users:
+            return 0
+    return getattr(source, 'decoded', source.frames) * source.channels * 2 #w trakcie dekodowania - tylko zapisane ramki
+
+
+class SharedDecodeSource: #jedno dekodowanie do pliku WAV - odtwarzanie, obwiednia i analiza w innym procesie czytają to samo pcm
+    _active = {} #plik wynikowy -> dekodowanie w toku; ten sam utwór z prefetchu i z decka dekodujemy raz
+    _users = {} #plik wynikowy -> liczba żywych źródeł, które go czytają; ostatnie usuwa plik
+    _active_lock = threading.RLock() #RLock - finalizer źródła może ruszyć przy zwalnianiu obiektu w trakcie open()
+
+    def __init__(self, original: str, filename: str, frames: int, sample_rate: int, channels: int, blocks):
+        self.original = original
+        self.filename = filename
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.channels = channels
+        with open(filename, 'wb') as f: #rozmiar danych w nagłówku dopiero po dekodowaniu - przerwany plik nie wygląda na gotowy
+            f.write(wav_header(0, channels, sample_rate))
+            try: #miejsce zajęte od razu - brak miejsca to OSError tutaj, a nie SIGBUS przy zapisie przez memmap
+                os.posix_fallocate(f.fileno(), 0, 44 + frames * channels * 2)
+            except OSError:
+                f.close()
+                os.remove(filename)
+                raise
+            except AttributeError: #system bez posix_fallocate - został sprawdzony wolny tmpfs
+                f.truncate(44 + frames * channels * 2)
+        self.samples = np.memmap(filename, dtype='<i2', mode='r+', offset=44, shape=(frames, channels))
+        self.decoded = 0 #ramki już zapisane - czytane bez locka przez odtwarzanie
+        self.complete = False
+        self.error = None
+        self.condition = threading.Condition()
+        self._direct = None #dekodowanie z pominięciem bufora - seek przed miejsce, do którego doszedł dekoder
+        threading.Thread(target=self._decode, args=(blocks,), daemon=True, name="Decode").start()
+
+    @classmethod
+    def open(cls, original: str, decode_dir: str, sample_rate: int): #gotowy plik z wcześniejszego dekodowania albo nowe
+        stat = os.stat(original)
+        key = hashlib.sha1(f"{os.path.abspath(original)}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()[:20]
+        filename = os.path.join(decode_dir, f"{key}.wav")
+        with cls._active_lock:
+            source = cls._existing(filename)
+            if source is not None:
+                return source
+            if soundfile is not None:
+                try:
+                    info = soundfile.info(original)
+                    channels = min(info.channels, 2)
+                    if not has_room(decode_dir, 44 + info.frames * channels * 2): #pełny tmpfs - każdy czytelnik dekoduje sam
+                        return SoundFileSource(original)
+                    blocks = map(lambda block: block[:, :channels], soundfile.blocks(original, blocksize=1 << 15, dtype='int16',
+                                                                                   always_2d=True))
+                    source = cls(original, filename, info.frames, info.samplerate, channels, blocks)
+                    cls._active[filename] = source
+                    return cls._track(source)
+                except OSError: #miejsce zniknęło między sprawdzeniem a alokacją
+                    return SoundFileSource(original)
+                except Exception:
+                    pass
+        #pygame dekoduje całość naraz - bez locka, inaczej inne decki, prefetch i finalizery czekałyby na cały plik
+        pcm = pygame_pcm(original, sample_rate)
+        with cls._active_lock:
+            source = cls._existing(filename) #inny wątek mógł w tym czasie zdekodować ten sam utwór
+            if source is not None:
+                return source
+            if not has_room(decode_dir, 44 + len(pcm) * 4):
+                return ArraySource(pcm, sample_rate)
+            try:
+                source = cls(original, filename, len(pcm), sample_rate, 2, iter([(pcm * 32767.0).astype('<i2')]))
+            except OSError:
+                return ArraySource(pcm, sample_rate)
+            cls._active[filename] = source
+            return cls._track(source)
+
+    @classmethod
+    def _existing(cls, filename: str): #wołane z _active_lock; dekodowanie w toku albo gotowy plik z wcześniejszego
+        if filename in cls._active:
+            return cls._track(cls._active[filename])
+        try:
+            source = MemmapWavSource(filename)
+            if source.frames > 0:
+                return cls._track(source)
+        except (OSError, ValueError):
+            pass
+        return None
+
+    @classmethod
+    def _track(cls, source): #wołane z _active_lock; każde źródło pliku to jeden użytkownik - plik żyje, dopóki żyje któreś z nich
+        cls._users[source.filename] = cls._users.get(source.filename, 0) + 1
+        weakref.finalize(source, _release_decoded, source.filename)
+        return source
+
+    def _decode(self, blocks):
+        position = 0
+        try:
+            for block in blocks:
+                count = min(len(block), self.frames - position)
+                self.samples[position:position + count] = block[:count]
+                position += count
+                with self.condition:
+                    self.decoded = position
+                    self.condition.notify_all()
+                if position >= self.frames:
+                    break
+            self.samples.flush()
+            with open(self.filename, 'r+b') as f: #plik kompletny - od teraz MemmapWavSource i procesy analizy go zmapują
+                f.write(wav_header(self.frames, self.channels, self.sample_rate))
+        except Exception as e:
+            print(f"Error decoding {self.original}: {e}")
+            self.error = e
+        finally:
+            with self.condition:
+                self.complete = True
+                self.condition.notify_all()
+            with self._active_lock:
+                self._active.pop(self.filename, None)
+
+    def wait(self, frames=None) -> bool: #czeka aż dekoder zapisze dane ramki (None - cały plik); False po błędzie
+        target = self.frames if frames is None else min(frames, self.frames)
+        with self.condition:
+            self.condition.wait_for(lambda: self.decoded >= target or self.complete)
+        return self.error is None
+
+    def read(self, start: int, frames: int) -> np.ndarray:
+        #tuż za dekoderem (start utworu, zwykłe odtwarzanie) czekamy chwilę - dalej (seek) dekodujemy kawałek osobno
+        if start <= self.decoded + (1 << 16) or soundfile is None:
+            self.wait(start + frames)
+            return to_stereo_float(self.samples[start:start + frames])
+        if self._direct is None:
+            self._direct = SoundFileSource(self.original)
+        return self._direct.read(start, frames)
+
+    def raw_blocks(self, block_frames: int): #bloki w miarę dekodowania - obwiednia liczy się równolegle z dekoderem
+        view = self.samples.view(np.ndarray)
+        view.flags.writeable = False
+        for start in range(0, self.frames, block_frames):
+            if not self.wait(start + block_frames):
+                raise RuntimeError(f"decoding failed: {self.error}")
+            yield view[start:start + block_frames]
+
+
+def pcm_path(source, filename: str) -> str: #plik, który proces analizy zmapuje zamiast dekodować jeszcze raz
+    if isinstance(source, SharedDecodeSource):
+        return source.filename if source.wait() else filename
+    if isinstance(source, MemmapWavSource):
+        return source.filename
+    return filename
+
+
+def open_source(filename: str, sample_rate: int, decode_dir=None): #najtańsze dostępne źródło dla pliku
+    if filename.lower().endswith('.wav'):
+        try:
+            return MemmapWavSource(filename)
+        except ValueError:
+            pass
+    if decode_dir is not None: #skompresowane formaty - jedno dekodowanie do wspólnego pcm zamiast osobnego dla każdego czytelnika
+        return SharedDecodeSource.open(filename, decode_dir, sample_rate)
+    if soundfile is not None:
+        try:
+            return SoundFileSource(filename)
+        except Exception:
+            pass
+    return ArraySource(pygame_pcm(filename, sample_rate), sample_rate)
+
+
+class StreamingDeck: #bufor pierścieniowy przed głowicą - wypełniany w tle, czytany przez callback audio
+    def __init__(self, source, output_rate: int, ring_seconds=2.0, chunk_frames=8192):
+        self.source = source
+        self.output_rate = output_rate
+        self.base_ratio = source.sample_rate / output_rate #ramki źródła na jedną ramkę wyjścia przy tempie 1
+        self.tempo = 1.0
+        self.ratio = self.base_ratio #aktualny krok w źródle - base_ratio * tempo
+        self.frames = int(source.frames / self.base_ratio) #długość utworu w ramkach wyjścia przy tempie 1
+        self.capacity = 1 << int(np.ceil(np.log2(max(ring_seconds * output_rate, chunk_frames * 2))))
+        self.chunk_frames = chunk_frames
+        self.ring = np.zeros((self.capacity, 2), dtype=np.float32)
+        self.lock = threading.Lock()
+        self.read_pos = 0 #licznik ramek wyjścia oddanych do miksu
+        self.write_pos = 0 #licznik ramek wyjścia wpisanych do bufora
+        self.source_pos = 0.0 #następna ramka źródła do zdekodowania
+        self.segments = deque([(0, 0.0, self.ratio)]) #(ramka bufora, ramka źródła, krok) - od kiedy obowiązuje dane tempo
+        self.generation = 0 #seek i zmiana tempa unieważniają kawałki dekodowane w trakcie
+        self.underruns = 0
+
+    @property
+    def position(self) -> int: #miejsce w utworze (ramki wyjścia przy tempie 1) - niezależne od aktualnego tempa
+        with self.lock:
+            return min(int(self._source_at(self.read_pos) / self.base_ratio), self.frames)
+
+    def _source_at(self, frame: int) -> float: #ramka źródła odpowiadająca ramce bufora; wołane z self.lock
+        start, source_start, step = next(filter(lambda segment: segment[0] <= frame, reversed(self.segments)),
+                                         self.segments[0])
+        return source_start + (frame - start) * step
+
+    def buffered(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def needs_fill(self) -> bool:
+        return self.source_pos < self.source.frames and self.capacity - self.buffered() >= self.chunk_frames
+
+    def is_finished(self) -> bool: #źródło wyczerpane i bufor oddany do miksu
+        with self.lock:
+            return self.source_pos >= self.source.frames and self.buffered() == 0
+
+    def seek(self, frame: int) -> int:
+        frame = max(0, min(int(frame), self.frames))
+        with self.lock:
+            self.read_pos = self.write_pos
+            self.source_pos = frame * self.base_ratio
+            self.segments = deque([(self.write_pos, self.source_pos, self.ratio)])
+            self.generation += 1
+        return frame
+
+    def retime(self, tempo: float, align=None, keep_frames=4096): #zmiana tempa bez opróżniania bufora - bez dziury w dźwięku
+        with self.lock:
+            splice = self.read_pos + min(self.buffered(), keep_frames) #to, co zaraz zagra, zostaje; dalej liczymy od nowa
+            source_pos = self._source_at(splice)
+            if align is not None: #align(sekunda utworu w miejscu sklejenia, opóźnienie sklejenia w s) -> nowa sekunda
+                seconds = align(source_pos / self.source.sample_rate, (splice - self.read_pos) / self.output_rate)
+                source_pos = min(max(0.0, seconds * self.source.sample_rate), float(self.source.frames))
+            self.tempo = tempo
+            self.ratio = self.base_ratio * tempo
+            while self.segments and self.segments[-1][0] >= splice:
+                self.segments.pop()
+            self.segments.append((splice, source_pos, self.ratio))
+            self.write_pos = splice
+            self.source_pos = source_pos
+            self.generation += 1
+
+    def fill(self) -> bool: #dekoduje jeden kawałek; wątek tła, nigdy callback audio
+        with self.lock:
+            if not self.needs_fill():
+                return False
+            generation, write_pos, source_pos, step = self.generation, self.write_pos, self.source_pos, self.ratio
+        frames = max(1, min(self.chunk_frames, int(np.ceil((self.source.frames - source_pos) / step))))
+        chunk = self._render_chunk(source_pos, frames, step)
+        with self.lock:
+            if generation != self.generation: #w międzyczasie był seek albo zmiana tempa
+                return True
+            start = write_pos % self.capacity
+            first = min(len(chunk), self.capacity - start)
+            self.ring[start:start + first] = chunk[:first]
+            self.ring[:len(chunk) - first] = chunk[first:]
+            self.write_pos = write_pos + len(chunk)
+            self.source_pos = source_pos + frames * step if len(chunk) == frames else float(self.source.frames)
+        return True
+
+    def _render_chunk(self, source_pos: float, frames: int, step: float) -> np.ndarray:
+        if step == 1.0 and source_pos == int(source_pos):
+            return self.source.read(int(source_pos), frames)
+        base = int(source_pos)
+        positions = source_pos - base + np.arange(frames) * step #interpolacja liniowa między ramkami źródła
+        raw = self.source.read(base, int(positions[-1]) + 2)
+        if len(raw) < 2:
+            return np.zeros((frames, 2), dtype=np.float32)
+        index = np.minimum(positions.astype(np.int64), len(raw) - 2)
+        frac = (positions - index).astype(np.float32)[:, None]
+        return raw[index] * (1.0 - frac) + raw[index + 1] * frac
+
+    def read(self, out: np.ndarray, frames: int) -> int: #callback audio: tylko kopiowanie z bufora
+        with self.lock:
+            n = min(frames, self.buffered())
+            if n < frames and self.source_pos < self.source.frames:
+                self.underruns += 1 #wątek tła nie nadążył - reszta bloku to cisza
+            start = self.read_pos % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self.ring[start:start + first]
+            out[first:n] = self.ring[:n - first]
+            out[n:frames] = 0.0
+            self.read_pos += n
+            while len(self.segments) > 1 and self.segments[1][0] <= self.read_pos: #odegrane odcinki tempa
+                self.segments.popleft()
+        return n
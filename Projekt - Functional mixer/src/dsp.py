@@ -0,0 +1,163 @@
+import math
+import time
+from collections import deque
+from functools import partial
+import numpy as np
+
+_kernel = None #filtr kaskady sos; scipy.signal importuje się ~1.3 s - ładowane w tle po starcie, nie przy imporcie modułu
+
+EQ_BANDS = ( #(typ, częstotliwość, Q) - jak na mikserze DJ: dwa shelfy i środek
+    ('lowshelf', 120.0, 0.707),
+    ('peaking', 1000.0, 0.7),
+    ('highshelf', 6000.0, 0.707)
+)
+EQ_RANGE = (-24.0, 6.0) #dB - na dole prawie wycięcie pasma
+IDENTITY = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+
+
+def biquad(kind: str, freq: float, gain_db: float, q: float, rate: float) -> list: #wzory RBJ (Audio EQ Cookbook) -> sekcja sos
+    a = 10.0 ** (gain_db / 40.0)
+    w0 = 2.0 * math.pi * min(freq, 0.45 * rate) / rate
+    cos, alpha = math.cos(w0), math.sin(w0) / (2.0 * q)
+    if kind == 'peaking':
+        b, den = (1 + alpha * a, -2 * cos, 1 - alpha * a), (1 + alpha / a, -2 * cos, 1 - alpha / a)
+    elif kind == 'lowshelf':
+        root = 2 * math.sqrt(a) * alpha
+        b = (a * ((a + 1) - (a - 1) * cos + root), 2 * a * ((a - 1) - (a + 1) * cos), a * ((a + 1) - (a - 1) * cos - root))
+        den = ((a + 1) + (a - 1) * cos + root, -2 * ((a - 1) + (a + 1) * cos), (a + 1) + (a - 1) * cos - root)
+    elif kind == 'highshelf':
+        root = 2 * math.sqrt(a) * alpha
+        b = (a * ((a + 1) + (a - 1) * cos + root), -2 * a * ((a - 1) + (a + 1) * cos), a * ((a + 1) + (a - 1) * cos - root))
+        den = ((a + 1) - (a - 1) * cos + root, 2 * ((a - 1) - (a + 1) * cos), (a + 1) - (a - 1) * cos - root)
+    elif kind == 'lowpass':
+        b, den = ((1 - cos) / 2, 1 - cos, (1 - cos) / 2), (1 + alpha, -2 * cos, 1 - alpha)
+    elif kind == 'highpass':
+        b, den = ((1 + cos) / 2, -(1 + cos), (1 + cos) / 2), (1 + alpha, -2 * cos, 1 - alpha)
+    else:
+        raise ValueError(f"Unknown filter type: {kind}")
+    return [b[0] / den[0], b[1] / den[0], b[2] / den[0], 1.0, den[1] / den[0], den[2] / den[0]]
+
+
+def sweep_section(value: float, rate: float) -> list: #jedno pokrętło: w lewo lowpass 20 kHz -> 40 Hz, w prawo highpass 20 Hz -> 10 kHz
+    if value == 0.0:
+        return IDENTITY
+    if value < 0:
+        section = biquad('lowpass', 20000.0 * (40.0 / 20000.0) ** -value, 0.0, 0.9, rate)
+    else:
+        section = biquad('highpass', 20.0 * (10000.0 / 20.0) ** value, 0.0, 0.9, rate)
+    wet = min(1.0, abs(value) * 5.0) #pierwsze 20% ruchu to płynne wejście filtra - bez przeskoku przy środku pokrętła
+    #dry/wet w samych współczynnikach: (1 - wet) + wet * B/A = ((1 - wet) * A + wet * B) / A - dalej jedna sekcja
+    return list(map(lambda b, a: (1.0 - wet) * a + wet * b, section[:3], section[3:])) + section[3:]
+
+
+def load_kernels(): #import scipy - wątek tła przy starcie albo pierwsze pokrętło; nigdy callback audio
+    global _kernel
+    if _kernel is not None:
+        return
+    from scipy.signal import sosfilt
+    public = partial(_public_sosfilt, sosfilt)
+    try:
+        from scipy.signal._sosfilt import _sosfilt #jądro sosfilt bez walidacji argumentów - kilka µs zamiast ~60 µs na wywołanie
+        _kernel = _sosfilt if _probe(_sosfilt, public) else public
+    except Exception: #inna wersja scipy (nazwa, sygnatura, typy) - publiczne sosfilt, wolniejsze, ale te same wyniki
+        _kernel = public
+
+
+def _probe(kernel, reference) -> bool: #prywatne jądro na małym bloku musi dać to samo co publiczne sosfilt - inaczej wyjątek w callbacku audio
+    sos = np.array([biquad('peaking', 1000.0, 6.0, 0.7, 44100.0), biquad('highpass', 100.0, 0.0, 0.9, 44100.0)])
+    x = np.random.default_rng(0).standard_normal((2, 256))
+    zi = np.random.default_rng(1).standard_normal((2, len(sos), 2))
+    expected_x, expected_zi = x.copy(), zi.copy()
+    reference(sos, expected_x, expected_zi)
+    kernel(sos, x, zi)
+    return np.allclose(x, expected_x) and np.allclose(zi, expected_zi)
+
+
+def kernels_ready() -> bool:
+    return _kernel is not None
+
+
+def _public_sosfilt(sosfilt, sos: np.ndarray, x: np.ndarray, zi: np.ndarray):
+    x[:], state = sosfilt(sos, x, axis=-1, zi=zi.transpose(1, 0, 2))
+    zi[:] = state.transpose(1, 0, 2)
+
+
+def sos_filter(sos: np.ndarray, x: np.ndarray, zi: np.ndarray): #x - (kanały, ramki) float64 C, zi - (kanały, sekcje, 2); w miejscu
+    _kernel(sos, x, zi)
+
+
+class EffectRack: #EQ i filtr dla każdego decka - biquady ze stanem, liczone blokami w wątku audio
+    def __init__(self, num_decks=2, rate=44100, channels=2, smoothing=0.03, sub_block=64):
+        self.rate = rate
+        self.channels = channels
+        self.smoothing = smoothing #stała czasowa wygładzania pokręteł (s) - bez trzasków przy ruchu
+        self.sub_block = sub_block #podczas ruchu współczynniki liczone co tyle ramek
+        self.targets = np.zeros((num_decks, 4)) #ustawienia z gui - zapis jednego elementu, bez locka
+        self.current = np.zeros((num_decks, 4)) #wartości wygładzone, zmieniane tylko w wątku audio
+        self.state = np.zeros((num_decks, channels, len(EQ_BANDS) + 1, 2)) #zi trzech pasm i filtra - ciągłość między blokami
+        self.sos = np.array(list(map(lambda _: self._sections(np.zeros(4)), range(num_decks)))) #współczynniki dla current
+        self.block_times = deque(maxlen=512) #czas przetwarzania całego bloku (wszystkie decki)
+
+    def set_eq(self, deck: int, band: int, gain_db: float):
+        load_kernels()
+        self.targets[deck, band] = min(EQ_RANGE[1], max(EQ_RANGE[0], gain_db))
+
+    def set_filter(self, deck: int, value: float):
+        load_kernels()
+        self.targets[deck, 3] = min(1.0, max(-1.0, value))
+
+    def reset(self, deck: int): #nowy utwór / skok - stary stan filtrów nie pasuje do nowego sygnału
+        self.state[deck] = 0.0
+
+    def is_active(self, deck: int) -> bool: #bez załadowanego jądra decki idą bez efektów - callback audio nie importuje scipy
+        return _kernel is not None and bool(self.targets[deck].any() or self.current[deck].any())
+
+    def process(self, decks, stack: np.ndarray): #stack - (decki, ramki, kanały) w kolejności decks, nadpisywany w miejscu
+        started = time.perf_counter()
+        for slot, deck in enumerate(decks):
+            if self.is_active(deck):
+                self._process_deck(deck, stack[slot])
+        self.block_times.append(time.perf_counter() - started)
+
+    def _sections(self, params: np.ndarray) -> np.ndarray: #3 pasma EQ + filtr -> jedna kaskada sos
+        return np.array(list(map(partial(self._section, params), range(len(EQ_BANDS) + 1))))
+
+    def _section(self, params, index: int) -> list:
+        if index == len(EQ_BANDS):
+            return sweep_section(float(params[index]), self.rate)
+        kind, freq, q = EQ_BANDS[index]
+        return biquad(kind, freq, float(params[index]), q, self.rate)
+
+    def _process_deck(self, deck: int, block: np.ndarray):
+        start, target = self.current[deck].copy(), self.targets[deck].copy()
+        end = start + (target - start) * (1.0 - math.exp(-len(block) / (self.rate * self.smoothing)))
+        close = np.abs(target - end) < 1e-3 #dosunięcie do celu - po ruchu deck wraca do jednego wywołania na blok
+        end[close] = target[close]
+        self.current[deck] = end
+        if np.array_equal(start, end): #pokrętła w miejscu - współczynniki z poprzedniego bloku, jedno wywołanie
+            self._filter(deck, block, self.sos[deck])
+            return
+        moving = np.flatnonzero(start != end) #przeliczamy tylko sekcje ruszanych pokręteł
+        steps = max(1, len(block) // self.sub_block)
+        previous = start[3]
+        for step, part in enumerate(np.array_split(block, steps)): #ruch pokrętła - parametry interpolowane między podblokami
+            params = start + (end - start) * (step + 1) / steps
+            if np.sign(params[3]) != np.sign(previous): #przejście lowpass <-> highpass - inny filtr, stary stan nie pasuje
+                self.state[deck, :, -1] = 0.0
+            for index in moving:
+                self.sos[deck, index] = self._section(params, index)
+            self._filter(deck, part, self.sos[deck])
+            previous = params[3]
+        if not end.any(): #wszystko neutralne - deck wraca do obejścia, stan od zera przy następnym ruchu
+            self.reset(deck)
+
+    def _filter(self, deck: int, part: np.ndarray, sos: np.ndarray):
+        work = part.T.astype(np.float64, order='C')
+        state = self.state[deck]
+        sos_filter(sos, work, state)
+        state[np.abs(state) < 1e-30] = 0.0 #wygasający stan po ciszy wpadałby w liczby subnormalne - kilkadziesiąt razy wolniejsze
+        part[:] = work.T
+
+    def get_load(self) -> dict:
+        times = np.fromiter(self.block_times, dtype=np.float64) if self.block_times else np.zeros(1)
+        return {'avg_ms': float(times.mean() * 1000), 'max_ms': float(times.max() * 1000)}
@@ -1,11 +1,21 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
-import pygame
 import numpy as np
 from functools import partial
 from itertools import starmap
 import os
 import time
+from deck_source import open_source, pcm_path, StreamingDeck
+from peak_pyramid import PeakPyramid
+from tempo_sync import tempo_ratio, aligned_position
+from dsp import EQ_RANGE
+from metering import FLOOR_DB
+
+METER_RANGE = (-60.0, 0.0) #dBFS na szerokość paska miernika
+METER_SIZE = (120, 10)
+PEAK_FALL = 0.5 #dB na odświeżenie (~15 dB/s przy 30 Hz) - opadanie znacznika szczytu
+CLIP_HOLD = 1.5 #s świecenia wskaźnika przesterowania
+CLIP_COLORS = ('#404040', '#ff2020')
 
 class GUI:
     def __init__(self, app):
@@ -17,6 +27,11 @@ class GUI:
         self.crossfader_var = None
         self.crossfader_label = None
         self.bpm_sync_label = None
+        self.num_decks = app.num_decks
+        self.meters = [] #paski poziomu decków, na końcu master
+        self.meter_holds = np.full(self.num_decks + 1, FLOOR_DB)
+        self.clip_until = np.zeros(self.num_decks + 1)
+        self.analysis_started = [0.0] * self.num_decks #czas zlecenia analizy decka - opóźnienie pierwszego wyniku w raporcie startu
 
     def setup_gui(self):
         main_frame = ttk.Frame(self.app.root, padding="10")
@@ -30,6 +45,7 @@ class GUI:
 
         self._setup_file_section(main_frame)
         self._setup_control_section(main_frame)
+        self.app.scrolling_view.setup(main_frame, row=2)
         self.app.waveform_display.setup_waveform_display(main_frame)
 
     def _setup_file_section(self, parent):
@@ -37,14 +53,17 @@ class GUI:
         file_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 10))
         file_frame.columnconfigure(1, weight=1)
 
-        track_configs = [
-            {"track": 0, "label": "Track 1:", "row": 0},
-            {"track": 1, "label": "Track 2:", "row": 1}
-        ]
+        track_configs = list(map(lambda track: {"track": track, "label": f"Track {track + 1}:", "row": track},
+                                 range(self.num_decks)))
 
         for config in track_configs:
             self._create_track_controls(file_frame, config)
 
+        self.prefetch_label = ttk.Label(file_frame, text="Prefetched: 0")
+        self.prefetch_label.grid(row=len(track_configs), column=1, sticky="ew", padx=(10, 5))
+        ttk.Button(file_frame, text="Prefetch...", command=self.prefetch_files).grid(
+            row=len(track_configs), column=4, padx=(5, 0), pady=(5, 0))
+
     def _create_track_controls(self, parent, config):
         row, track = config["row"], config["track"]
         ttk.Label(parent, text=config["label"]).grid(row=row, column=0, sticky=tk.W)
@@ -63,40 +82,46 @@ class GUI:
         control_frame = ttk.LabelFrame(parent, text="Playback Controls", padding="5")
         control_frame.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(0, 10))
 
-        button_configs = [ #dane wejściowe do poźniejszych funckji
-            ("Play Both", self.play_both, "green"),
-            ("Stop Both", self.stop_both, "red"),
-            ("Play Track 1", partial(self.play_track, 0), "lightgreen"),
-            ("Play Track 2", partial(self.play_track, 1), "lightgreen"),
-            ("Pause Track 1", partial(self.toggle_pause_track, 0), "orange"),
-            ("Pause Track 2", partial(self.toggle_pause_track, 1), "orange"),
-            ("Stop Track 1", partial(self.stop_track, 0), "lightcoral"),
-            ("Stop Track 2", partial(self.stop_track, 1), "lightcoral"),
+        global_configs = [ #dane wejściowe do poźniejszych funckji
+            ("Play All", self.play_all, "green"),
+            ("Stop All", self.stop_all, "red"),
+            ("Reset Tempo", self.reset_tempo, "lightgray"),
         ]
+        deck_configs = [config for track in range(self.num_decks) for config in ( #po jednym wierszu przycisków na deck
+            (f"Play Track {track + 1}", partial(self.play_track, track), "lightgreen"),
+            (f"Pause Track {track + 1}", partial(self.toggle_pause_track, track), "orange"),
+            (f"Stop Track {track + 1}", partial(self.stop_track, track), "lightcoral"),
+            (f"Sync to Track {track + 1}", partial(self.sync_to_track, track), "lightblue"),
+        )]
 
         buttons = list(starmap( #rozpakowuje wszytkie elementy, aplikuje je do funkcji lambda, a lambda tworzy button
             lambda text, command, color: self._create_styled_button(control_frame, text, command, color),
-            button_configs
+            global_configs + deck_configs
         ))
+        positions = (list(map(lambda i: (0, i), range(len(global_configs)))) +
+                     list(map(lambda i: (1 + i // 4, i % 4), range(len(deck_configs)))))
 
         list(starmap(
-            lambda i, btn: btn.grid(row=i // 4, column=i % 4, padx=5, pady=2, sticky="ew"), # dla każdego buttona wywołuje funkcje grid i rozmieszcza w gridzie elementy
-            enumerate(buttons) # enumerate tworzy parę - numeruje buttony
+            lambda btn, position: btn.grid(row=position[0], column=position[1], padx=5, pady=2, sticky="ew"), # dla każdego buttona wywołuje funkcje grid i rozmieszcza w gridzie elementy
+            zip(buttons, positions) # zip łączy button z jego miejscem w gridzie
         ))
 
         for i in range(4):
             control_frame.columnconfigure(i, weight=1)
 
+        self.bpm_sync_label = ttk.Label(control_frame, text="Tempo: original")
+        self.bpm_sync_label.grid(row=self.num_decks + 1, column=0, columnspan=4, pady=(2, 0))
+
         self._setup_volume_controls(control_frame)
 
     def _setup_volume_controls(self, parent):
         volume_frame = ttk.LabelFrame(parent, text="Volume Controls", padding="5")
-        volume_frame.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(0, 10))
+        volume_frame.grid(row=self.num_decks + 2, column=0, columnspan=4, sticky="ew", pady=(0, 10))
 
-        self.volume_vars = list(map(lambda _: tk.DoubleVar(value=70), range(2)))
+        self.volume_vars = list(map(lambda _: tk.DoubleVar(value=70), range(self.num_decks)))
         self.crossfader_var = tk.DoubleVar(value=50)
 
-        for i in range(2):
+        for i in range(self.num_decks):
             ttk.Label(volume_frame, text=f"Track {i + 1} Volume").grid(row=i, column=0, sticky=tk.W, padx=(0, 10))
             scale = ttk.Scale(volume_frame, from_=0, to=100, variable=self.volume_vars[i],
                               command=partial(self.adjust_individual_volume, track=i))
@@ -105,54 +130,113 @@ class GUI:
             vol_label.grid(row=i, column=2, sticky=tk.W, padx=(10, 0))
             self.volume_vars[i].trace('w', lambda *args, idx=i, lbl=vol_label: lbl.config(
                 text=f"{int(self.volume_vars[idx].get())}%"))
+            self._create_deck_effects(volume_frame, i)
+            self.meters.append(self._create_meter(volume_frame, i))
 
-        ttk.Label(volume_frame, text="Crossfader", font=("Arial", 10, "bold")).grid(row=2, column=0, sticky=tk.W,
+        row = self.num_decks
+        ttk.Label(volume_frame, text="Crossfader", font=("Arial", 10, "bold")).grid(row=row, column=0, sticky=tk.W,
                                                                                     padx=(0, 10), pady=(15, 5))
-        ttk.Label(volume_frame, text="Track 1", foreground="blue").grid(row=3, column=0, sticky=tk.W, padx=(20, 0))
-        ttk.Label(volume_frame, text="Track 2", foreground="red").grid(row=3, column=2, sticky=tk.E, padx=(0, 20))
+        ttk.Label(volume_frame, text=self.crossfader_sides[0], foreground="blue").grid(row=row + 1, column=0, sticky=tk.W,
+                                                                                       padx=(20, 0))
+        ttk.Label(volume_frame, text=self.crossfader_sides[1], foreground="red").grid(row=row + 1, column=2, sticky=tk.E,
+                                                                                      padx=(0, 20))
         crossfader_scale = ttk.Scale(volume_frame, from_=0, to=100, variable=self.crossfader_var,
                                      command=self.adjust_crossfader, length=300)
-        crossfader_scale.grid(row=3, column=1, sticky="ew", padx=(10, 10), pady=(5, 5))
+        crossfader_scale.grid(row=row + 1, column=1, sticky="ew", padx=(10, 10), pady=(5, 5))
         self.crossfader_label = ttk.Label(volume_frame, text="50% (Balanced)")
-        self.crossfader_label.grid(row=4, column=1, pady=(0, 5))
+        self.crossfader_label.grid(row=row + 2, column=1, pady=(0, 5))
         self.crossfader_var.trace('w', self._update_crossfader_label)
+        ttk.Label(volume_frame, text="Master").grid(row=row + 1, column=10, sticky=tk.E, padx=(10, 2))
+        self.meters.append(self._create_meter(volume_frame, row + 1))
         volume_frame.columnconfigure(1, weight=1)
 
+    def _create_deck_effects(self, parent, track: int): #EQ low/mid/high i filtr - pokrętła w tym samym wierszu co głośność
+        knobs = [
+            ("Low", partial(self.app.mixer_engine.set_eq, track, 0), EQ_RANGE),
+            ("Mid", partial(self.app.mixer_engine.set_eq, track, 1), EQ_RANGE),
+            ("High", partial(self.app.mixer_engine.set_eq, track, 2), EQ_RANGE),
+            ("Filter", lambda value: self.app.mixer_engine.set_filter(track, value / 100.0), (-100.0, 100.0))
+        ]
+        for column, (text, setter, (low, high)) in enumerate(knobs):
+            variable = tk.DoubleVar(value=0.0)
+            ttk.Label(parent, text=text).grid(row=track, column=3 + 2 * column, sticky=tk.E, padx=(10, 2))
+            scale = ttk.Scale(parent, from_=low, to=high, variable=variable, length=80,
+                              command=lambda value, setter=setter: setter(float(value)))
+            scale.grid(row=track, column=4 + 2 * column, sticky="ew")
+            scale.bind('<Double-Button-1>', lambda event, variable=variable, setter=setter: (variable.set(0.0), setter(0.0))) #powrót do zera
+
+    def _create_meter(self, parent, row) -> dict: #pasek rms, znacznik szczytu, wskaźnik przesterowania i głośność LUFS
+        width, height = METER_SIZE
+        canvas = tk.Canvas(parent, width=width, height=height, bg='#202020', highlightthickness=0)
+        canvas.grid(row=row, column=11, padx=(10, 2))
+        label = ttk.Label(parent, text="-- LUFS", width=10)
+        label.grid(row=row, column=12, sticky=tk.W)
+        return {
+            'canvas': canvas,
+            'label': label,
+            'rms': canvas.create_rectangle(0, 0, 0, height, fill='#2e8b57', width=0),
+            'peak': canvas.create_line(0, 0, 0, height, fill='#ffd700'),
+            'clip': canvas.create_rectangle(width - height, 0, width, height, fill=CLIP_COLORS[0], width=0),
+            'clipped': False,
+            'text': "-- LUFS"
+        }
+
+    def update_meters(self, levels: dict): #wątek tk - tylko przesunięcie elementów canvasa, tekst gdy się zmienił
+        now = time.monotonic()
+        self.meter_holds = np.maximum(levels['peak_db'], self.meter_holds - PEAK_FALL)
+        self.clip_until[levels['clips'] > 0] = now + CLIP_HOLD
+        loudness = levels['lufs'] if levels['lufs'] is not None else np.full(len(self.meters), FLOOR_DB)
+        clipped = (self.clip_until > now).tolist()
+        list(starmap(self._draw_meter, zip(self.meters, levels['rms_db'], self.meter_holds, clipped, loudness)))
+
+    def _draw_meter(self, meter, rms_db, peak_db, clipped, lufs):
+        canvas, height = meter['canvas'], METER_SIZE[1]
+        canvas.coords(meter['rms'], 0, 0, self._meter_x(rms_db), height)
+        x = self._meter_x(peak_db)
+        canvas.coords(meter['peak'], x, 0, x, height)
+        if meter['clipped'] != clipped:
+            meter['clipped'] = clipped
+            canvas.itemconfig(meter['clip'], fill=CLIP_COLORS[clipped])
+        text = f"{lufs:.1f} LUFS" if lufs > FLOOR_DB else "-- LUFS"
+        if meter['text'] != text:
+            meter['text'] = text
+            meter['label'].config(text=text)
+
+    @staticmethod
+    def _meter_x(db) -> float: #dB -> piksel; miejsce na wskaźnik przesterowania zostaje wolne
+        low, high = METER_RANGE
+        return (METER_SIZE[0] - METER_SIZE[1] - 1) * min(1.0, max(0.0, (db - low) / (high - low)))
+
     def _create_styled_button(self, parent, text, command, bg_color):
         return tk.Button(parent, text=text, command=command, bg=bg_color, font=("Arial", 9), relief="raised",
                          borderwidth=2, padx=10, pady=3)
 
+    @property
+    def crossfader_sides(self) -> tuple: #decki nieparzyste po lewej, parzyste po prawej - jak crossfader_sides w silniku
+        return tuple(map(lambda first: "Track " + "/".join(map(str, range(first, self.num_decks + 1, 2))), (1, 2)))
+
     def _update_crossfader_label(self, *args):
         value = int(self.crossfader_var.get())
         if value < 25:
-            text = f"{100 - value}% Track 1"
+            text = f"{100 - value}% {self.crossfader_sides[0]}"
         elif value > 75:
-            text = f"{value}% Track 2"
+            text = f"{value}% {self.crossfader_sides[1]}"
         else:
             text = f"{value}% (Balanced)"
         self.crossfader_label.config(text=text)
 
     def adjust_individual_volume(self, value, track: int):
-        with self.app.state_lock:
-            volume = float(value) / 100.0
-            self.app.audio_state.state['volumes'][track] = volume
+        self.app.audio_state.update(track, volume=float(value) / 100.0)
         self._apply_crossfaded_volume()
 
     def adjust_crossfader(self, value):
         self._apply_crossfaded_volume()
 
-    def _apply_crossfaded_volume(self):
-        with self.app.state_lock:
-            crossfader_pos = self.crossfader_var.get() / 100.0
-            track1_curve = np.cos(crossfader_pos * np.pi / 2)
-            track2_curve = np.sin(crossfader_pos * np.pi / 2)
-            for i in range(2):
-                base_volume = self.volume_vars[i].get() / 100.0
-                final_volume = base_volume * (track1_curve if i == 0 else track2_curve)
-                if (self.app.audio_state.state['files'][i] and
-                        self.app.audio_state.state['playing'][i] and
-                        self.app.audio_state.state['channels'][i]):
-                    self.app.audio_state.state['channels'][i].set_volume(final_volume)
+    def _apply_crossfaded_volume(self): #krzywa cos/sin liczy silnik - tu tylko przekazujemy ustawienia
+        engine = self.app.mixer_engine
+        engine.set_crossfader(self.crossfader_var.get() / 100.0)
+        for i in range(self.num_decks):
+            engine.set_volume(i, self.volume_vars[i].get() / 100.0)
 
     def load_file(self, track_index: int):
         filetypes = (
@@ -166,122 +250,199 @@ class GUI:
         filename = filedialog.askopenfilename(title=f'Select audio file for Track {track_index + 1}',
                                               filetypes=filetypes)
         if filename:
-            if self.app.audio_state.state['playing'][track_index]:
-                self.stop_track(track_index)
-            with self.app.state_lock:
-                self.app.audio_state.state['data'][track_index] = None
-                self.app.audio_state.state['waveform_cache'][track_index] = None
-                self.app.audio_state.state['time_axes'][track_index] = None
-                self.app.audio_state.state['filenames'][track_index] = filename
-                sound = pygame.mixer.Sound(filename)
-                self.app.audio_state.state['files'][track_index] = sound
-                self.app.audio_state.state['durations'][track_index] = sound.get_length()
-                self.app.audio_state.state['bpm_analyzing'][track_index] = True
-            self.app.update_queue.put(('file_loaded', (track_index, filename)))
-            self.bpm_labels[track_index].config(text="BPM: Analyzing...")
-            self.app.executor.submit(self._process_audio_async, sound, track_index)
-            self.app.executor.submit(self._analyze_bpm_async, filename, track_index)
-
-    def _process_audio_async(self, sound, track_index):
+            self.load_track(track_index, filename)
+
+    def prefetch_files(self): #utwory na później - dekodowanie i analiza w tle, potem ładowanie bez czekania
+        filenames = filedialog.askopenfilenames(title='Select tracks to prefetch',
+                                                filetypes=(('Audio files', '*.mp3 *.wav *.ogg *.flac *.m4a'),
+                                                           ('All files', '*.*')))
+        list(map(self.app.prefetch_cache.warm, filenames))
+        self.update_prefetch_label()
+
+    def update_prefetch_label(self):
+        stats = self.app.prefetch_cache.stats()
+        self.prefetch_label.config(text=f"Prefetched: {stats['ready']}/{stats['entries']} "
+                                        f"({stats['bytes'] / 2 ** 20:.0f} MB, hits {stats['hits']}, misses {stats['misses']})")
+
+    def load_track(self, track_index: int, filename: str):
+        if self.app.audio_state.deck(track_index).playing:
+            self.stop_track(track_index)
+        engine = self.app.mixer_engine
+        entry = self.app.prefetch_cache.take(filename) #przygotowany wcześniej - bez dekodowania i analizy
+        #WAV - mapowanie pamięci, inne - jedno dekodowanie do wspólnego pcm, z którego czyta też analiza
+        source = entry['source'] if entry else open_source(filename, engine.frequency, self.app.decode_dir)
+        stream = entry['stream'] if entry else StreamingDeck(source, engine.frequency)
+        self.app.audio_state.update(track_index, waveform=None, filename=filename, source=source,
+                                    duration=engine.frames_to_seconds(stream.frames), analyzing=True,
+                                    bpm=None, beat_times=(), confidence=0.0,
+                                    tempo=1.0) #nowy strumień gra w oryginalnym tempie
+        engine.load(track_index, stream)
+        self.app.utils.post_update('file_loaded', (track_index, filename))
+        self.bpm_labels[track_index].config(text="BPM: Analyzing...")
+        token = self.app.analysis_pool.new_token(track_index) #stare analizy tego decka stają się nieaktualne
+        self.analysis_started[track_index] = time.perf_counter()
+        if entry and entry['pyramid'] is not None:
+            self._apply_waveform(filename, track_index, entry['pyramid'])
+        else:
+            self.app.executor.submit(self._process_audio_async, source, filename, track_index)
+        if entry and entry['analysis'] is not None:
+            self._apply_bpm_result(track_index, token, entry['analysis'])
+        else:
+            self.app.executor.submit(self._analyze_bpm_async, source, filename, track_index, token)
+        self.update_prefetch_label()
+
+    def _process_audio_async(self, source, filename, track_index):
         try:
-            processed_data = self.app.audio_processor.process_audio(sound)
-            duration = self.app.audio_state.state['durations'][track_index]
-            time_axis = np.linspace(0, duration, len(processed_data))
-            with self.app.state_lock:
-                self.app.audio_state.state['data'][track_index] = processed_data
-                self.app.audio_state.state['waveform_cache'][track_index] = processed_data
-                self.app.audio_state.state['time_axes'][track_index] = time_axis
-            self.app.update_queue.put(('waveform_update', track_index))
+            processor, cache = self.app.audio_processor, self.app.analysis_cache
+            cached = cache.get(filename, 'waveform', processor.waveform_params) #znany plik - bez ponownego liczenia
+            if cached is not None:
+                processed_data = PeakPyramid.from_arrays(cached)
+            else:
+                processed_data = processor.process_audio(source)
+                cache.put(filename, 'waveform', processor.waveform_params, processed_data.to_arrays())
+            self._apply_waveform(filename, track_index, processed_data)
         except Exception as e:
             print(f"Error processing audio: {e}")
 
-    def _analyze_bpm_async(self, filename, track_index):
+    def _apply_waveform(self, filename, track_index, processed_data):
+        if self.app.audio_state.update(track_index, when=lambda deck: deck.filename == filename, #w międzyczasie mógł wejść inny plik
+                                       waveform=processed_data):
+            self.app.utils.post_update('waveform_update', track_index)
+
+    def _analyze_bpm_async(self, source, filename, track_index, token): #cache albo zlecenie do puli procesów - nikt tu nie czeka
         try:
-            bpm, beats, confidence = self.app.audio_processor.calculate_bpm_advanced(filename)
-            with self.app.state_lock:
-                self.app.audio_state.state['bpm_values'][track_index] = bpm
-                self.app.audio_state.state['beat_times'][track_index] = beats
-                self.app.audio_state.state['tempo_confidence'][track_index] = confidence
-                self.app.audio_state.state['bpm_analyzing'][track_index] = False
-            self.app.update_queue.put(('bpm_update', (track_index, bpm, confidence)))
+            processor = self.app.audio_processor
+            cached = self.app.analysis_cache.get(filename, 'bpm', processor.bpm_params)
+            if cached is not None:
+                result = float(cached['bpm']), list(cached['beat_times']), float(cached['confidence'])
+                self._apply_bpm_result(track_index, token, result)
+            else:
+                #proces analizy mapuje zdekodowane pcm decka - bez drugiego dekodowania pliku
+                self.app.analysis_pool.submit_bpm(pcm_path(source, filename), token,
+                                                  partial(self._on_bpm_analyzed, filename, track_index, token),
+                                                  on_progress=partial(self._on_bpm_progress, track_index, token), hold=source)
         except Exception as e:
             print(f"Error analyzing BPM: {e}")
-            with self.app.state_lock:
-                self.app.audio_state.state['bpm_analyzing'][track_index] = False
-
-    def play_both(self):
-        valid_tracks = list(filter(lambda i: self.app.audio_state.state['files'][i] is not None, range(2)))
+            self._apply_bpm_result(track_index, token, None)
+
+    def _on_bpm_progress(self, track_index, token, bpm, confidence): #wstępny bpm - sync działa zanim analiza się skończy
+        if not self.app.analysis_pool.is_current(token):
+            return
+        if self.app.audio_state.update(track_index, when=lambda deck: deck.analyzing, bpm=bpm, confidence=confidence):
+            self.app.utils.post_update('bpm_progress', (track_index, bpm, confidence))
+            self._mark_first_analysis('first_provisional_bpm', track_index)
+
+    def _on_bpm_analyzed(self, filename, track_index, token, result): #wynik z procesu roboczego
+        if result is not None and result[0] is not None: #błędów analizy nie zapamiętujemy
+            bpm, beats, confidence = result
+            self.app.executor.submit(self.app.analysis_cache.put, filename, 'bpm', self.app.audio_processor.bpm_params, {
+                'bpm': np.float64(bpm),
+                'beat_times': np.asarray(beats, dtype=np.float64),
+                'confidence': np.float64(confidence)
+            })
+        self._apply_bpm_result(track_index, token, result)
+
+    def _apply_bpm_result(self, track_index, token, result):
+        if not self.app.analysis_pool.is_current(token): #deck ma już inny plik
+            return
+        bpm, beats, confidence = result if result is not None else (None, [], 0.0)
+        self.app.audio_state.update(track_index, bpm=bpm, beat_times=tuple(beats), confidence=confidence, analyzing=False)
+        self.app.utils.post_update('bpm_update', (track_index, bpm, confidence))
+        self._mark_first_analysis('first_bpm', track_index)
+
+    def _mark_first_analysis(self, name, track_index): #pierwszy wynik od uruchomienia i od zlecenia analizy
+        if self.app.startup.mark(name):
+            self.app.startup.mark(f"{name}_latency", time.perf_counter() - self.analysis_started[track_index])
+
+    def play_all(self):
+        valid_tracks = list(filter(lambda i: self.app.audio_state.deck(i).source is not None, range(self.num_decks)))
         list(map(self.play_track, valid_tracks))
 
-    def stop_both(self):
-        list(map(self.stop_track, range(2)))
+    def stop_all(self):
+        list(map(self.stop_track, range(self.num_decks)))
 
     def play_track(self, track_index: int):
-        with self.app.state_lock:
-            if (self.app.audio_state.state['files'][track_index] and
-                    not self.app.audio_state.state['playing'][track_index]):
-                sound = self.app.audio_state.state['files'][track_index]
-                channel = pygame.mixer.find_channel()
-                if channel:
-                    self.app.audio_state.state['channels'][track_index] = channel
-                    if self.app.audio_state.state['paused'][track_index]:
-                        channel.play(sound)
-                        self.app.audio_state.state['paused'][track_index] = False
-                        self.app.audio_state.state['start_times'][track_index] = (
-                            time.time() - self.app.audio_state.state['pause_positions'][track_index]
-                        )
-                    else:
-                        channel.play(sound)
-                        self.app.audio_state.state['pause_positions'][track_index] = 0
-                        self.app.audio_state.state['start_times'][track_index] = time.time()
-                    self.app.audio_state.state['playing'][track_index] = True
-                    self._apply_crossfaded_volume()
+        deck = self.app.audio_state.deck(track_index)
+        if deck.source is not None and not deck.playing:
+            start_frame = deck.pause_position if deck.paused else 0
+            if self.app.mixer_engine.play(track_index, start_frame):
+                self.app.audio_state.update(track_index, paused=False, pause_position=0, playing=True)
+                self._apply_crossfaded_volume()
+        self.app.scheduler.notify() #start odtwarzania budzi konsumentów pozycji i waveformu
 
     def toggle_pause_track(self, track_index: int):
-        if self.app.audio_state.state['playing'][track_index]:
+        deck = self.app.audio_state.deck(track_index)
+        if deck.playing:
             self._pause_track(track_index)
-        elif self.app.audio_state.state['paused'][track_index]:
+        elif deck.paused:
             self.play_track(track_index)
 
     def _pause_track(self, track_index: int):
-        if (self.app.audio_state.state['playing'][track_index] and
-                self.app.audio_state.state['channels'][track_index]):
-            current_time = time.time()
-            self.app.audio_state.state['pause_positions'][track_index] = (
-                current_time - self.app.audio_state.state['start_times'][track_index]
-            )
-            self.app.audio_state.state['channels'][track_index].stop()
-            self.app.audio_state.state['playing'][track_index] = False
-            self.app.audio_state.state['paused'][track_index] = True
+        if self.app.audio_state.deck(track_index).playing:
+            frame = self.app.mixer_engine.pause(track_index)
+            self.app.audio_state.update(track_index, pause_position=frame,
+                                        current_position=self.app.mixer_engine.frames_to_seconds(frame),
+                                        playing=False, paused=True)
+            self.app.waveform_display.mark_dirty(track_index)
+
+    def seek_track(self, track_index: int, seconds: float): #ustawienie pozycji bez przerywania odtwarzania
+        if self.app.audio_state.deck(track_index).source is None:
+            return
+        engine = self.app.mixer_engine
+        frame = engine.seek(track_index, engine.seconds_to_frames(seconds))
+        if not self.app.audio_state.update(track_index, when=lambda deck: not deck.playing, #zatrzymany deck wystartuje od nowej pozycji
+                                           current_position=engine.frames_to_seconds(frame), paused=True,
+                                           pause_position=frame):
+            self.app.audio_state.update(track_index, current_position=engine.frames_to_seconds(frame))
+        self.app.waveform_display.mark_dirty(track_index)
 
     def stop_track(self, track_index: int):
-        if self.app.audio_state.state['channels'][track_index]:
-            self.app.audio_state.state['channels'][track_index].stop()
-        state_resets = {
-            'playing': False,
-            'paused': False,
-            'pause_positions': 0,
-            'current_positions': 0,
-            'start_times': 0
-        }
-        for key, value in state_resets.items():
-            self.app.audio_state.state[key][track_index] = value
-
-    def analyze_all_bpm(self):
-        for i in range(2):
-            if self.app.audio_state.state['files'][i]:
-                filename = self.app.audio_state.state['filenames'][i]
-                bpm, beats, confidence = self.app.audio_processor.calculate_bpm_advanced(filename)
-                self.app.audio_state.state['bpm_values'][i] = bpm
-                self.app.audio_state.state['beat_times'][i] = beats
-                self.app.audio_state.state['tempo_confidence'][i] = confidence
-                self.bpm_labels[i].config(text=f"BPM: {bpm if bpm else 'N/A'}")
-                self.confidence_labels[i].config(text=f"Conf: {int(confidence * 100)}%")
-        self.bpm_sync_label.config(text="BPM Analysis Complete")
-
-    def sync_to_track(self, reference_track: int):
-        if self.app.audio_state.state['bpm_values'][reference_track]:
-            self.bpm_sync_label.config(
-                text=f"Synced to Track {reference_track + 1} BPM: {self.app.audio_state.state['bpm_values'][reference_track]}")
-        else:
+        self.app.mixer_engine.stop(track_index)
+        self.app.audio_state.update(track_index, playing=False, paused=False, pause_position=0, current_position=0.0)
+        self.app.waveform_display.mark_dirty(track_index)
+
+    def analyze_all_bpm(self): #ponowna analiza załadowanych decków w tle - gui nie czeka na wynik
+        for i, deck in enumerate(self.app.audio_state.snapshot()):
+            if deck.source is not None and deck.filename:
+                token = self.app.analysis_pool.new_token(i)
+                self.app.audio_state.update(i, analyzing=True)
+                self.bpm_labels[i].config(text="BPM: Analyzing...")
+                self.analysis_started[i] = time.perf_counter()
+                self.app.executor.submit(self._analyze_bpm_async, deck.source, deck.filename, i, token)
+        if self.bpm_sync_label:
+            self.bpm_sync_label.config(text="BPM Analysis Started")
+
+    def sync_to_track(self, reference_track: int): #resampling pozostałych decków do bpm referencji + wyrównanie fazy beatów
+        decks = self.app.audio_state.snapshot()
+        reference = decks[reference_track]
+        if not reference.bpm:
             self.bpm_sync_label.config(text="No BPM data for reference track")
+            return
+        targets = list(filter(lambda i: i != reference_track and decks[i].source is not None and decks[i].bpm,
+                              range(len(decks))))
+        if not targets:
+            self.bpm_sync_label.config(text="No other track with BPM data")
+            return
+        engine = self.app.mixer_engine
+        reference_seconds = engine.frames_to_seconds(engine.get_position(reference_track))
+        for target in targets:
+            tempo = tempo_ratio(decks[target].bpm, reference.bpm * reference.tempo)
+            can_align = reference.playing and len(reference.beat_times) > 0 and len(decks[target].beat_times) > 0
+            align = partial(self._align_beats, reference, decks[target], tempo, reference_seconds) if can_align else None
+            engine.set_tempo(target, tempo, align)
+            self.app.audio_state.update(target, tempo=tempo)
+        self.bpm_sync_label.config(text=f"Synced to Track {reference_track + 1}: {reference.bpm * reference.tempo:.1f} BPM"
+                                        f"{'' if reference.playing else ' (tempo only)'}")
+        self.app.waveform_display.mark_dirty(*targets)
+
+    def _align_beats(self, reference, target, tempo, reference_seconds, seconds, delay): #wołane przez deck w miejscu sklejenia
+        return aligned_position(
+            (reference.beat_times, reference.bpm, reference.tempo,
+             reference_seconds + delay * reference.tempo), #referencja też gra, zanim sklejenie dojdzie do głośnika
+            (target.beat_times, target.bpm, tempo, seconds))
+
+    def reset_tempo(self):
+        for i in range(len(self.app.audio_state.snapshot())):
+            self.app.mixer_engine.set_tempo(i, 1.0)
+            self.app.audio_state.update(i, tempo=1.0)
+        self.bpm_sync_label.config(text="Tempo: original")
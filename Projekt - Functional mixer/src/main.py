@@ -1,20 +1,36 @@
-import pygame
+import time
+STARTED = time.perf_counter() #początek raportu startu - pierwsza instrukcja po imporcie time, przed wszystkimi innymi importami
+import argparse
+import shutil
 import tkinter as tk
-from threading import RLock
 from concurrent.futures import ThreadPoolExecutor
 import threading
-import queue
 from gui import GUI
 from audio_processor import AudioProcessor
 from audio_state import AudioState
 from waveform_display import WaveformDisplay
+from scrolling_view import ScrollingWaveformView
 from utils import Utils
+from mixer_engine import MixerEngine
+from scheduler import Scheduler
+from analysis_cache import AnalysisCache
+from analysis_pool import AnalysisPool
+from deck_preloader import PrefetchCache
+from deck_source import new_decode_dir, clean_stale_decode_dirs
+from metrics import Metrics, StartupReport
+from update_bus import UpdateBus
+import dsp
 
 class FunctionalAudioMixer:
-    def __init__(self):
-        pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
-        pygame.mixer.init()
-        pygame.mixer.set_num_channels(8) #konfiguracja silnika pygame
+    def __init__(self, num_decks=2, idle_report=False, metrics_path=None, metrics_interval=5.0, startup_report=False):
+        self.startup = StartupReport(STARTED, verbose=startup_report) #czas do interakcji i do pierwszej analizy
+        self.startup.mark('imports')
+        self.num_decks = num_decks #liczba decków - gui, silnik, stan i analiza skalują się razem
+        self.idle_report = idle_report #co kilka sekund wypisuje zużycie CPU - sprawdzenie czy bezczynny mikser nic nie robi
+        self.metrics = Metrics(enabled=metrics_path is not None, dump_path=metrics_path, dump_interval=metrics_interval)
+        #dekodowanie przez soundfile - mixer pygame startuje dopiero przy formacie, którego libsndfile nie czyta
+        self.mixer_engine = MixerEngine(num_decks=self.num_decks, frequency=44100, block_size=512, channels=2,
+                                        lock=self.metrics.instrument_lock(threading.Lock(), 'engine_lock')) #callback audio i komendy gui
 
         self.root = tk.Tk() #tworzenie okna apki z biblioteki tkinter
         self.root.title("Mikser Audio")
@@ -23,31 +39,67 @@ class FunctionalAudioMixer:
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
 
-        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="AudioMixer") #zadania asynchroniczne
-        self.update_queue = queue.Queue(maxsize=100) #aktualizacja gui
+        self.executor = self.metrics.instrument_executor(ThreadPoolExecutor(max_workers=4, thread_name_prefix="AudioMixer"),
+                                                         'executor') #zadania asynchroniczne
+        self.update_bus = UpdateBus() #aktualizacja gui - scalane po kluczu, nadawca nie czeka
         self.shutdown_event = threading.Event() # zamykanie wątków
-        self.state_lock = RLock() # synchronizacja do wspólnego stanu audio
-        #Rlock - specjalny tryb lock który pozwala wątkowi wejść więcej niż raz do danej sekcji kodu (nie jest blokowany jak w przypadku zwykłego lock)
+        self.scheduler = Scheduler(self.shutdown_event) #jeden wątek tła zamiast pętli z sleep
 
-        self.audio_state = AudioState()
-        self.audio_state.state_lock = self.state_lock
+        self.audio_state = AudioState(num_decks=self.num_decks, lock=self.metrics.instrument_lock(threading.Lock(), 'state_lock')) #czytelnicy bez locka, piszący tylko na czas podmiany
         self.audio_processor = AudioProcessor()
+        self.analysis_cache = AnalysisCache() #wyniki analizy trzymane na dysku między uruchomieniami
+        clean_stale_decode_dirs() #pcm po poprzednim uruchomieniu, które się nie zamknęło
+        self.decode_dir = new_decode_dir('mixer_pcm') #zdekodowane mp3/ogg/flac - jedno pcm dla odtwarzania i analizy
+        self.analysis_pool = AnalysisPool(num_decks=self.num_decks) #bpm liczone w osobnych procesach
+        self.prefetch_cache = PrefetchCache(self) #utwory przygotowane w tle do natychmiastowego załadowania
         self.utils = Utils(self)
         self.waveform_display = WaveformDisplay(self)
+        self.scrolling_view = ScrollingWaveformView(self) #przybliżony widok do beatmatchingu - sam tkinter i numpy, od razu przy starcie
         self.gui = GUI(self)
+        self._register_gauges()
 
         self.gui.setup_gui()
-        self.waveform_display.setup_animation()
         self.utils.start_background_threads()
+        audio_error = self.mixer_engine.start() #jeden strumień wyjściowy zamiast kanałów pygame
+        if audio_error is not None:
+            self.utils.post_update('error', f"Error opening audio output: {audio_error}")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.after_idle(self._on_window_shown) #pierwsza bezczynność pętli tk - okno narysowane i przyjmuje kliknięcia
+
+    def _on_window_shown(self): #wykres, filtry i procesy analizy ładowane w tle - okno nie czeka na importy
+        self.startup.mark('window_shown')
+        self.analysis_pool.warm_up(on_done=lambda pid, seconds: self.startup.mark('analysis_warm'))
+        self.executor.submit(self._warm_up)
+
+    def _warm_up(self):
+        try:
+            self.waveform_display.load_backend()
+            self.root.after(0, self._build_canvas)
+            dsp.load_kernels()
+            self.startup.mark('dsp_ready')
+        except Exception as e:
+            print(f"Error during warm-up: {e}")
+
+    def _build_canvas(self):
+        self.waveform_display.build_canvas()
+        self.startup.mark('waveform_ready')
+
+    def _register_gauges(self): #wartości odczytywane dopiero przy snapshocie - zero kosztu między zrzutami
+        self.metrics.gauge('analysis_queue_depth', self.analysis_pool.queue_depth)
+        self.metrics.gauge('update_bus_pending', self.update_bus.pending)
+        self.metrics.gauge('update_bus_coalesced', lambda: self.update_bus.coalesced)
+        self.metrics.gauge('audio_load', self.mixer_engine.get_load)
+        self.metrics.gauge('prefetch', self.prefetch_cache.stats)
+        self.metrics.gauge('startup', self.startup.snapshot)
 
     def on_closing(self): #bezpieczne zamknięcie apki
         try:
-            self.shutdown_event.set() #informacja wątków o zamknięciu
-            if hasattr(self.waveform_display, 'anim') and self.waveform_display.anim:
-                self.waveform_display.anim.event_source.stop() #zatrzymanie animacji
+            self.scheduler.stop() #informacja wątków o zamknięciu
+            self.metrics.dump() #ostatni zrzut przy zamknięciu
             self.executor.shutdown(wait=False)
-            pygame.mixer.stop()
+            self.analysis_pool.shutdown()
+            self.mixer_engine.close()
+            shutil.rmtree(self.decode_dir, ignore_errors=True)
             self.root.destroy() # zniszczenie gui
         except Exception as e:
             print(f"Error during cleanup: {e}")
@@ -55,9 +107,24 @@ class FunctionalAudioMixer:
     def run(self):
         self.root.mainloop()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mikser Audio")
+    parser.add_argument('--idle-report', action='store_true',
+                        help="co 5 s wypisuj zużycie CPU procesu i liczbę wybudzeń schedulera")
+    parser.add_argument('--metrics', metavar='PATH', default=None,
+                        help="włącz metryki (locki, kolejka gui, klatki) i dopisuj je do pliku JSON lines")
+    parser.add_argument('--metrics-interval', type=float, default=5.0, help="co ile sekund zrzut metryk")
+    parser.add_argument('--decks', type=int, default=2, choices=range(1, 9), metavar='N',
+                        help="liczba decków (1-8), nieparzyste po lewej stronie crossfadera")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="wypisuj czasy startu: pokazanie okna, gotowy wykres, rozgrzana analiza, pierwszy bpm")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     try:
-        app = FunctionalAudioMixer()
+        args = parse_args()
+        app = FunctionalAudioMixer(num_decks=args.decks, idle_report=args.idle_report, metrics_path=args.metrics,
+                                   metrics_interval=args.metrics_interval, startup_report=args.startup_report)
         app.run()
     except Exception as e:
         print(f"Failed to start application: {str(e)}")
@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from collections import deque
+import numpy as np
+import dsp
+
+K_WEIGHTING = ( #filtr wstępny ITU-R BS.1770 (shelf ~+4 dB powyżej 1.7 kHz) i highpass RLB - jak w pomiarze LUFS
+    ('highshelf', 1681.97, 3.99984, 0.7071752),
+    ('highpass', 38.1355, 0.0, 0.5003270)
+)
+FLOOR_DB = -90.0 #cisza - pasek miernika na samym dole
+CLIP_LEVEL = 1.0 #próbka na pełnej skali albo wyżej - przesterowanie (master liczony przed np.clip)
+
+
+def to_db(values: np.ndarray) -> np.ndarray:
+    return np.maximum(20.0 * np.log10(np.maximum(values, 1e-12)), FLOOR_DB)
+
+
+class LevelMeter: #poziomy decków i mastera z bloków faktycznie granych - w callbacku audio tylko kilka redukcji numpy na blok
+    def __init__(self, num_decks=2, rate=44100, channels=2, block_size=512, window=3.0, queue_seconds=1.0):
+        self.num_meters = num_decks + 1 #ostatni - master
+        self.rate = rate
+        self.channels = channels
+        self.block_size = block_size
+        self.window = window #okno głośności krótkoterminowej (s) - jak short-term loudness
+        self.lock = threading.Lock() #audio dopisuje blok, odczyt zabiera sumy i kolejkę - tylko kilka operacji na małych tablicach
+        self.peaks = np.zeros(self.num_meters) #od ostatniego odczytu
+        self.squares = np.zeros(self.num_meters)
+        self.frames = 0
+        self.clips = np.zeros(self.num_meters, dtype=np.int64) #bloki z przesterowaniem od ostatniego odczytu
+        self.sos = np.array(list(map(lambda section: dsp.biquad(*section, rate), K_WEIGHTING)))
+        self.state = np.zeros((self.num_meters, channels, len(K_WEIGHTING), 2)) #stan filtra K każdego miernika
+        #grane bloki czekające na filtr K - pierścień alokowany raz; pełny (brak odczytu) = kolejne bloki bez głośności
+        self.ring = np.zeros((self.num_meters, int(queue_seconds * rate), channels), dtype=np.float32)
+        self.head = 0 #początek najstarszego nieodczytanego bloku
+        self.queued = 0 #ramki zajęte w pierścieniu - odczyt zwalnia je dopiero po przefiltrowaniu
+        self.blocks = deque() #(mierniki, ramki) kolejnych bloków w pierścieniu
+        self.silent_frames = 0 #cisza bez granych decków - okno głośności przesuwane o liczbę bloków, bez filtra
+        slots = int(math.ceil(window * rate / block_size)) + 1
+        self.energy = np.zeros((slots, self.num_meters)) #energia K-ważona każdego bloku - pierścień na okno głośności
+        self.energy_frames = np.zeros(slots, dtype=np.int64)
+        self.slot = 0
+        self.block_times = deque(maxlen=512) #koszt pomiaru na blok - ma być pomijalny przy budżecie bloku
+
+    def process(self, active, stack, mix: np.ndarray): #stack - decki po EQ, przed głośnością; mix - suma przed obcięciem
+        started = time.perf_counter()
+        frames = len(mix)
+        peaks, squares = np.zeros(self.num_meters), np.zeros(self.num_meters)
+        if len(active):
+            peaks[active] = np.maximum(stack.max(axis=(1, 2)), -stack.min(axis=(1, 2)))
+            squares[active] = np.einsum('dfc,dfc->d', stack, stack)
+        peaks[-1] = max(mix.max(), -mix.min())
+        squares[-1] = np.einsum('fc,fc->', mix, mix)
+        with self.lock:
+            np.maximum(self.peaks, peaks, out=self.peaks)
+            self.squares += squares
+            self.frames += frames
+            self.clips += peaks >= CLIP_LEVEL
+            #bez scipy nie ma czego ważyć; bez czytelnika pierścień się zapełnia i nowe bloki po prostu przepadają
+            queue = dsp.kernels_ready() and self.queued + frames <= len(self.ring[0])
+            start = (self.head + self.queued) % len(self.ring[0])
+            if queue:
+                self.queued += frames
+        if queue: #miejsce za nieodczytanymi blokami - czytelnik go nie dotyka, więc kopia już bez locka
+            meters = list(active) + [self.num_meters - 1]
+            if len(active):
+                self._write(active, stack, start)
+            self._write([self.num_meters - 1], mix[None], start)
+            with self.lock:
+                self.blocks.append((meters, frames))
+        self.block_times.append(time.perf_counter() - started)
+
+    def silence(self, frames: int): #blok bez decków - tylko licznik, żadnych redukcji w callbacku audio
+        with self.lock:
+            self.frames += frames
+            self.silent_frames += frames
+
+    def _write(self, meters, rows: np.ndarray, start: int): #rows - (mierniki, ramki, kanały), z zawinięciem na końcu pierścienia
+        first = min(rows.shape[1], len(self.ring[0]) - start)
+        self.ring[meters, start:start + first] = rows[:, :first]
+        self.ring[meters, :rows.shape[1] - first] = rows[:, first:]
+
+    def snapshot(self) -> dict: #wątek schedulera: poziomy od poprzedniego odczytu + głośność z ostatnich `window` s
+        with self.lock:
+            peaks, squares, frames, clips = self.peaks.copy(), self.squares.copy(), self.frames, self.clips.copy()
+            self.peaks[:] = 0.0
+            self.squares[:] = 0.0
+            self.frames = 0
+            self.clips[:] = 0
+            blocks, self.blocks = self.blocks, deque()
+            silent, self.silent_frames = self.silent_frames, 0
+            position = self.head
+        for meters, count in blocks: #filtr K poza callbackiem audio - pierścień zwalniany dopiero po przeczytaniu
+            self._weigh(meters, self._read(meters, position, count))
+            position = (position + count) % len(self.ring[0])
+        with self.lock:
+            self.head = position
+            self.queued -= sum(map(lambda block: block[1], blocks))
+        if silent:
+            self._skip(silent)
+        newest = (self.slot - 1 - np.arange(len(self.energy_frames))) % len(self.energy_frames) #od najnowszego bloku
+        covered = np.cumsum(self.energy_frames[newest])
+        count = min(int(np.searchsorted(covered, self.window * self.rate)) + 1, len(covered))
+        mean_square = self.energy[newest[:count]].sum(axis=0) / max(int(covered[count - 1]), 1)
+        loudness = np.maximum(-0.691 + 10.0 * np.log10(np.maximum(mean_square, 1e-12)), FLOOR_DB)
+        return {
+            'peak_db': to_db(peaks),
+            'rms_db': to_db(np.sqrt(squares / max(frames * self.channels, 1))),
+            'lufs': loudness if dsp.kernels_ready() else None,
+            'clips': clips
+        }
+
+    def _read(self, meters, start: int, frames: int) -> np.ndarray: #(kanały mierników, ramki) float64 C - wejście sos_filter
+        first = min(frames, len(self.ring[0]) - start)
+        rows = self.ring[meters, start:start + first]
+        if first < frames:
+            rows = np.concatenate([rows, self.ring[meters, :frames - first]], axis=1)
+        return rows.transpose(0, 2, 1).astype(np.float64, order='C').reshape(-1, frames)
+
+    def _weigh(self, meters, work: np.ndarray): #filtr K i energia jednego bloku - wszystkie mierniki jednym wywołaniem
+        state = self.state[meters].reshape(-1, len(K_WEIGHTING), 2)
+        dsp.sos_filter(self.sos, work, state)
+        state[np.abs(state) < 1e-30] = 0.0 #jak w EffectRack - bez liczb subnormalnych po ciszy
+        self.state[meters] = state.reshape(len(meters), self.channels, len(K_WEIGHTING), 2)
+        self.energy[self.slot] = 0.0
+        self.energy[self.slot, meters] = np.einsum('rf,rf->r', work, work).reshape(len(meters), self.channels).sum(axis=1)
+        self.energy_frames[self.slot] = work.shape[1]
+        self.slot = (self.slot + 1) % len(self.energy_frames)
+
+    def _skip(self, frames: int): #cisza po graniu - zerowa energia w kolejnych slotach, najwyżej całe okno
+        count = min(-(-frames // self.block_size), len(self.energy_frames))
+        slots = (self.slot + np.arange(count)) % len(self.energy_frames)
+        self.energy[slots] = 0.0
+        self.energy_frames[slots] = self.block_size
+        self.slot = (self.slot + count) % len(self.energy_frames)
+        self.state[:] = 0.0 #filtr K po ciszy i tak wygasa do zera
+
+    def get_load(self) -> dict:
+        times = np.fromiter(self.block_times, dtype=np.float64) if self.block_times else np.zeros(1)
+        return {'avg_ms': float(times.mean() * 1000), 'max_ms': float(times.max() * 1000)}
@@ -0,0 +1,188 @@
+import json
+import threading
+import time
+
+BUCKETS = 26 #kubełek k: czasy do 2**k mikrosekund (ostatni - wszystko dłuższe niż ~16 s)
+
+
+class Histogram: #histogram logarytmiczny czasów - stała pamięć, zapis O(1)
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        micros = int(seconds * 1e6)
+        self.counts[min(micros.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction: float) -> float: #górna granica kubełka - dokładność do 2x wystarcza do szukania zatorów
+        target, seen = fraction * self.count, 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * self.percentile(0.5),
+            'p90_ms': 1000 * self.percentile(0.9),
+            'p99_ms': 1000 * self.percentile(0.99),
+            'max_ms': 1000 * self.max,
+            'buckets_us': dict(map(lambda item: (1 << item[0], item[1]), filter(lambda item: item[1], enumerate(self.counts))))
+        }
+
+
+class InstrumentedLock: #lock z pomiarem oczekiwania i trzymania; zagnieżdżone wejścia (RLock) liczone jako jedno trzymanie
+    def __init__(self, lock, metrics, name):
+        self._lock = lock
+        self._metrics = metrics
+        self._name = name
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1) -> bool:
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            depth = getattr(self._local, 'depth', 0)
+            if depth == 0:
+                now = time.perf_counter()
+                self._metrics.observe(f"{self._name}.wait", now - started)
+                self._local.held_since = now
+            self._local.depth = depth + 1
+        return acquired
+
+    def release(self):
+        self._local.depth -= 1
+        held = time.perf_counter() - self._local.held_since if self._local.depth == 0 else None
+        self._lock.release()
+        if held is not None:
+            self._metrics.observe(f"{self._name}.hold", held)
+            self._metrics.observe(f"{self._name}.hold.{_thread_group()}", held)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class InstrumentedExecutor: #licznik zadań zleconych i jeszcze niezakończonych - bez zaglądania do prywatnej kolejki puli
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self.pending = 0 #czekające + wykonywane
+
+    def submit(self, func, *args, **kwargs):
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self, *args, **kwargs):
+        self._executor.shutdown(*args, **kwargs)
+
+
+def _thread_group() -> str: #AudioMixer_0..3 -> AudioMixer - wątki jednej puli w jednym histogramie
+    return threading.current_thread().name.split('_')[0]
+
+
+class Metrics: #opcjonalna instrumentacja gorących ścieżek; wyłączona - brak opakowań i jedno sprawdzenie flagi
+    def __init__(self, enabled=False, dump_path=None, dump_interval=5.0):
+        self.enabled = enabled
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {} #nazwa -> funkcja bez argumentów, odczytywana przy snapshocie
+        self.started = time.time()
+
+    def instrument_lock(self, lock, name):
+        return InstrumentedLock(lock, self, name) if self.enabled else lock
+
+    def instrument_executor(self, executor, name): #gauge <name>_queue_depth tylko przy włączonych metrykach
+        if not self.enabled:
+            return executor
+        instrumented = InstrumentedExecutor(executor)
+        self.gauge(f"{name}_queue_depth", lambda: instrumented.pending)
+        return instrumented
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def increment(self, name: str, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, read):
+        self.gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            histograms = dict(map(lambda item: (item[0], item[1].summary()), sorted(self.histograms.items())))
+            counters = dict(self.counters)
+        gauges = {}
+        for name, read in self.gauges.items():
+            try:
+                gauges[name] = read()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {'time': time.time(), 'uptime': time.time() - self.started, 'histograms': histograms,
+                'counters': counters, 'gauges': gauges}
+
+    def dump(self): #jedna linia JSON na zrzut - plik można czytać w trakcie działania miksera
+        if not self.enabled or self.dump_path is None:
+            return
+        try:
+            with open(self.dump_path, 'a') as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+
+class StartupReport: #kamienie milowe startu - czas do interakcji i do pierwszej analizy
+    #mierzony przedział: od STARTED w main.py (pierwsza instrukcja modułu po samym `import time`, przed wszystkimi innymi
+    #importami) do kamienia; bez startu interpretera - ten razem z importami mierzy benchmark startup_import (nowy proces)
+    def __init__(self, started: float, verbose=False):
+        self.started = started #time.perf_counter() z main.STARTED
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.marks = {}
+
+    def mark(self, name: str, seconds=None) -> bool: #seconds - własny czas trwania zamiast czasu od startu; liczy się pierwszy wpis
+        with self.lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = seconds if seconds is not None else time.perf_counter() - self.started
+        if self.verbose:
+            print(f"Startup: {name} {self.marks[name] * 1000:.0f} ms")
+        return True
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(map(lambda item: (item[0], round(item[1], 4)), self.marks.items()))
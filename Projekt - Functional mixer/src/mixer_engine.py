@@ -0,0 +1,271 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from pygame._sdl2 import audio as sdl_audio, init_subsystem, INIT_AUDIO
+from dsp import EffectRack
+from metering import LevelMeter
+
+
+def crossfade_curves(position: float) -> tuple: #krzywa cos/sin crossfadera (0 - Track 1, 1 - Track 2)
+    angle = position * np.pi / 2
+    return float(np.cos(angle)), float(np.sin(angle))
+
+
+class MixerEngine: #jeden strumień wyjściowy - wszystkie decki miksowane w blokach po block_size ramek
+    def __init__(self, num_decks=2, frequency=44100, block_size=512, channels=2, background_fill=True, lock=None):
+        self.num_decks = num_decks
+        self.frequency = frequency
+        self.block_size = block_size
+        self.channels = channels
+        self.device = None
+        self.device_paused = False #nic nie gra - SDL nie woła callbacku, bezczynny mikser nie budzi wątku audio
+        self.device_lock = threading.Lock() #pauza/wznowienie urządzenia; nigdy pod self.lock - SDL czeka na koniec callbacku
+        self.lock = lock if lock is not None else threading.Lock() #trzymany tylko na czas jednego bloku albo krótkiej komendy z gui
+
+        self.decks = [None] * num_decks #StreamingDeck - bufor pierścieniowy przed głowicą
+        self.playing = [False] * num_decks
+        self.finished = [False] * num_decks
+        self.stopping = np.zeros(num_decks, dtype=bool) #pauza/stop - jeszcze jeden blok z rampą do zera, potem koniec
+        self.rewind = np.zeros(num_decks, dtype=bool) #stop - po wyciszeniu powrót na początek
+        self.volumes = np.full(num_decks, 0.5, dtype=np.float32)
+        self.crossfader = 0.5
+        self.crossfader_sides = np.arange(num_decks) % 2 #0 - strona cos, 1 - strona sin
+        self.current_gains = np.zeros(num_decks, dtype=np.float32)
+        self.effects = EffectRack(num_decks, frequency, channels) #EQ i filtr każdego decka, liczone w callbacku audio
+        self.meter = LevelMeter(num_decks, frequency, channels, block_size) #poziomy decków i mastera z granych bloków
+
+        self._stack = np.zeros((num_decks, block_size, channels), dtype=np.float32)
+        self._ramp = np.linspace(0.0, 1.0, block_size, endpoint=False, dtype=np.float32)
+        self.block_times = deque(maxlen=512) #czas renderowania ostatnich bloków (s)
+        self.overruns = 0
+        self.fill_event = threading.Event() #budzi wątek dekodujący, gdy któryś bufor ma miejsce
+        self.fill_thread = None
+        self.background_fill = background_fill #False - bufory uzupełnia wołający (render offline), bez wątku tła
+        self._closed = False
+
+    def start(self): #otwiera domyślne urządzenie SDL, które samo woła callback po każdy blok; błąd zwraca do pokazania w gui
+        try:
+            init_subsystem(INIT_AUDIO)
+            self.device = self._open_device(None)
+            self.device_paused = True #wznawia pierwsze play
+            return None
+        except Exception as e:
+            self.device = None
+            return str(e)
+
+    def _open_device(self, name):
+        try:
+            return sdl_audio.AudioDevice(name, False, self.frequency, sdl_audio.AUDIO_F32, self.channels, self.block_size, 0,
+                                         self._audio_callback)
+        except TypeError: #pygame 2.6 nie przyjmuje None mimo dokumentacji - pierwsza nazwa z listy to domyślne wyjście SDL
+            names = sdl_audio.get_audio_device_names(False)
+            if name is not None or not names:
+                raise RuntimeError("no audio output device")
+            return self._open_device(names[0])
+
+    def close(self):
+        self._closed = True
+        self.fill_event.set()
+        with self.device_lock:
+            if self.device is not None:
+                self.device.pause(1)
+                self.device.close()
+                self.device = None
+
+    def _resume_device(self):
+        with self.device_lock:
+            if self.device is not None and self.device_paused:
+                self.device_paused = False
+                self.device.pause(0)
+
+    def _pause_if_idle(self): #wątek tła - callback nie może pauzować urządzenia, na którym właśnie działa
+        with self.device_lock:
+            with self.lock:
+                idle = self.device is not None and not self.device_paused and not any(self.playing)
+            if idle: #play w międzyczasie czeka na device_lock i wznowi urządzenie zaraz po nas
+                self.device.pause(1)
+                self.device_paused = True
+                self.meter.silence(int(self.meter.window * self.frequency)) #bez bloków okno głośności od razu opada do ciszy
+
+    def load(self, deck: int, stream):
+        with self.lock:
+            self.decks[deck] = stream
+            self.playing[deck] = False
+            self.stopping[deck] = self.rewind[deck] = False
+            self.finished[deck] = False
+            self.effects.reset(deck)
+        self._wake_filler()
+
+    def _wake_filler(self):
+        if not self.background_fill:
+            return
+        if self.fill_thread is None:
+            self.fill_thread = threading.Thread(target=self._fill_loop, daemon=True, name="DeckStreamer")
+            self.fill_thread.start()
+        self.fill_event.set()
+
+    def _fill_loop(self): #dekodowanie przed głowicą - jedyne miejsce, które czyta z dysku
+        while not self._closed:
+            self.fill_event.clear()
+            worked = False
+            for stream in list(self.decks):
+                while stream is not None and stream.fill():
+                    worked = True
+            if not any(self.playing) and not self.device_paused:
+                self._pause_if_idle()
+            if not worked:
+                self.fill_event.wait() #wszystkie bufory pełne - czekamy na callback albo seek
+
+    def play(self, deck: int, start_frame: int = 0):
+        stream = self.decks[deck]
+        if stream is None:
+            return False
+        if stream.position != start_frame:
+            stream.seek(start_frame)
+            stream.fill() #pierwszy kawałek od razu, żeby nie zacząć od dziury
+        with self.lock:
+            self.current_gains[deck] = 0.0 #start od zera - rampa w pierwszym bloku zamiast trzasku
+            self.finished[deck] = False
+            self.effects.reset(deck)
+            self.stopping[deck] = self.rewind[deck] = False
+            self.playing[deck] = True
+        self._resume_device()
+        self._wake_filler()
+        return True
+
+    def pause(self, deck: int) -> int: #zatrzymuje deck bez zerowania pozycji, zwraca ramkę pauzy
+        with self.lock:
+            self._fade_out(deck)
+            return self.get_position(deck)
+
+    def stop(self, deck: int):
+        with self.lock:
+            if self._fade_out(deck):
+                self.rewind[deck] = True #seek dopiero po bloku wyciszenia - wcześniej wyzerowałby mu bufor
+                return
+        if self.decks[deck] is not None:
+            self.decks[deck].seek(0)
+            self._wake_filler()
+
+    def _fade_out(self, deck: int) -> bool: #wołane z self.lock; True - deck gaśnie w następnym bloku callbacku
+        if self.playing[deck] and self.device is not None and not self.device_paused:
+            self.stopping[deck] = True
+            return True
+        self.playing[deck] = False #bez działającego urządzenia nie przyjdzie żaden blok - nie ma czego wyciszać
+        return False
+
+    def seek(self, deck: int, frame: int) -> int: #skok do dowolnej ramki - bufor przed głowicą dekoduje się od nowa w tle
+        stream = self.decks[deck]
+        if stream is None:
+            return 0
+        frame = stream.seek(frame)
+        stream.fill()
+        with self.lock:
+            self.current_gains[deck] = 0.0
+            self.finished[deck] = False
+            self.effects.reset(deck)
+        self._wake_filler()
+        return frame
+
+    def set_tempo(self, deck: int, tempo: float, align=None): #resampling decka - nowe tempo słychać po ~0.1 s, bez przerwy
+        stream = self.decks[deck]
+        if stream is None:
+            return
+        stream.retime(tempo, align)
+        self._wake_filler()
+
+    def get_position(self, deck: int) -> int: #liczba ramek faktycznie wyrenderowanych dla decka
+        stream = self.decks[deck]
+        return stream.position if stream is not None else 0
+
+    def frames_to_seconds(self, frames: int) -> float:
+        return frames / self.frequency
+
+    def seconds_to_frames(self, seconds: float) -> int:
+        return int(round(seconds * self.frequency))
+
+    def set_volume(self, deck: int, volume: float):
+        self.volumes[deck] = volume #zmiana trafia do następnego bloku
+
+    def set_eq(self, deck: int, band: int, gain_db: float): #0 - low, 1 - mid, 2 - high; wygładzane w wątku audio
+        self.effects.set_eq(deck, band, gain_db)
+
+    def set_filter(self, deck: int, value: float): #-1 lowpass ... 0 wyłączony ... 1 highpass
+        self.effects.set_filter(deck, value)
+
+    def set_crossfader(self, position: float):
+        self.crossfader = min(1.0, max(0.0, position))
+
+    def target_gains(self) -> np.ndarray: #głośność * krzywa crossfadera dla wszystkich decków naraz
+        left, right = crossfade_curves(self.crossfader)
+        curves = np.where(self.crossfader_sides == 0, left, right).astype(np.float32)
+        return self.volumes * curves
+
+    def render_block(self, out: np.ndarray): #out - (ramki, kanały) float32, nadpisywany w miejscu
+        started = time.perf_counter()
+        frames = len(out)
+        with self.lock:
+            active = [i for i in range(self.num_decks) if self.playing[i]]
+            target = self.target_gains()
+            target[self.stopping] = 0.0 #pauza/stop - rampa do zera jak przy starcie, bez urwania w pół fali
+            if not active: #nic nie gra i żadne wyciszenie nie czeka - tylko cisza i licznik bloków miernika
+                out.fill(0.0)
+                self.meter.silence(frames)
+                self.fill_event.set() #wątek tła zapauzuje urządzenie
+            else:
+                if frames > self._stack.shape[1]:
+                    self._stack = np.zeros((self.num_decks, frames, self.channels), dtype=np.float32)
+                stack = self._stack[:len(active), :frames]
+                for slot, deck in enumerate(active):
+                    self._fill_slot(stack[slot], deck, frames)
+                self.fill_event.set() #właśnie zwolniło się miejsce w buforach
+                self.effects.process(active, stack) #EQ/filtr przed wzmocnieniem - decki bez ustawień są pomijane
+                current = self.current_gains[active]
+                ramp = self._ramp[:frames] if frames == self.block_size else np.linspace(
+                    0.0, 1.0, frames, endpoint=False, dtype=np.float32)
+                gains = current[:, None] + (target[active] - current)[:, None] * ramp[None, :] #rampa bez trzasków
+                np.einsum('df,dfc->fc', gains, stack, out=out) #wzmocnienie i sumowanie wszystkich decków jednym wywołaniem
+                self.meter.process(active, stack, out) #decki po EQ, master przed obcięciem - widać przesterowanie
+                np.clip(out, -1.0, 1.0, out=out)
+            self.current_gains[:] = target
+            self._finish_fades()
+        elapsed = time.perf_counter() - started
+        self.block_times.append(elapsed)
+        if elapsed > frames / self.frequency:
+            self.overruns += 1
+
+    def _finish_fades(self): #wołane z self.lock po bloku z rampą do zera - deck wypada z miksu
+        for deck in np.flatnonzero(self.stopping):
+            self.playing[deck] = False
+            self.stopping[deck] = False
+            if self.rewind[deck]:
+                self.rewind[deck] = False
+                self.decks[deck].seek(0) #tylko liczniki pod lockiem strumienia - bufor od nowa dekoduje wątek tła
+                self.fill_event.set()
+
+    def _fill_slot(self, slot: np.ndarray, deck: int, frames: int):
+        stream = self.decks[deck]
+        stream.read(slot, frames)
+        if stream.is_finished():
+            self.playing[deck] = False
+            self.finished[deck] = True
+
+    def _audio_callback(self, device, stream): #wątek audio SDL - nie może czekać na nic poza self.lock
+        try:
+            self.render_block(np.frombuffer(stream, dtype=np.float32).reshape(-1, self.channels))
+        except Exception as e:
+            print(f"Error in audio callback: {e}")
+
+    def get_load(self) -> dict: #koszt CPU na blok w stosunku do budżetu czasu jednego bloku
+        budget = self.block_size / self.frequency
+        times = np.fromiter(self.block_times, dtype=np.float64) if self.block_times else np.zeros(1)
+        return {
+            'budget_ms': budget * 1000,
+            'avg_ms': float(times.mean() * 1000),
+            'max_ms': float(times.max() * 1000),
+            'load': float(times.mean() / budget),
+            'overruns': self.overruns,
+            'dsp': self.effects.get_load(),
+            'meter': self.meter.get_load()
+        }
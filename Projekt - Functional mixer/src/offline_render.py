@@ -0,0 +1,123 @@
+import os
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy') #render nie potrzebuje karty dźwiękowej - pygame tylko do dekodowania
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import json
+import time
+import wave
+import numpy as np
+import pygame
+from deck_source import open_source, StreamingDeck
+from mixer_engine import MixerEngine
+from metering import FLOOR_DB
+
+
+class Automation: #punkty (czas, wartość) łączone liniowo; przed pierwszym i po ostatnim wartość stała
+    def __init__(self, initial: float, points=()):
+        points = sorted(points)
+        self.times = np.array([0.0] + list(map(lambda point: point[0], points)), dtype=np.float64)
+        self.values = np.array([initial if not points or points[0][0] > 0 else points[0][1]] +
+                               list(map(lambda point: point[1], points)), dtype=np.float64)
+
+    def at(self, seconds: float) -> float:
+        return float(np.interp(seconds, self.times, self.values))
+
+
+class OfflineRenderer: #mix bez karty dźwiękowej - ten sam MixerEngine.render_block, tylko tak szybko jak pozwala CPU
+    def __init__(self, mix: dict, sample_rate=44100, block_frames=16384, base_dir='.'):
+        self.mix = mix
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames #duże bloki - narzut pythona rozłożony na wiele ramek
+        self.decks = mix['decks']
+        self.engine = MixerEngine(num_decks=len(self.decks), frequency=sample_rate, background_fill=False)
+        self.streams = list(map(lambda deck: StreamingDeck(open_source(os.path.join(base_dir, deck['file']), sample_rate),
+                                                           sample_rate), self.decks))
+        list(map(self.engine.load, range(len(self.streams)), self.streams))
+        list(map(lambda stream, deck: stream.retime(deck.get('tempo', 1.0)), self.streams, self.decks))
+        self.starts = list(map(lambda deck: self.engine.seconds_to_frames(deck.get('start', 0.0)), self.decks))
+        self.crossfader = Automation(mix.get('crossfader', 0.5), map(
+            lambda event: (event['time'], event['crossfader']), filter(lambda event: 'crossfader' in event,
+                                                                         mix.get('automation', []))))
+        self.volumes = list(map(lambda index: Automation(self.decks[index].get('volume', 0.5), map(
+            lambda event: (event['time'], event['volume']), filter(
+                lambda event: event.get('deck') == index and 'volume' in event, mix.get('automation', [])))),
+            range(len(self.decks))))
+
+    def total_frames(self) -> int: #koniec ostatniego decka albo długość podana w pliku miksu
+        if self.mix.get('duration') is not None:
+            return self.engine.seconds_to_frames(self.mix['duration'])
+        ends = map(lambda stream, deck, start: start + int(
+            (stream.frames - self.engine.seconds_to_frames(deck.get('offset', 0.0))) / deck.get('tempo', 1.0)),
+                   self.streams, self.decks, self.starts)
+        return max(ends, default=0)
+
+    def boundaries(self, total: int) -> np.ndarray: #bloki kończą się na startach decków i punktach automatyki - zmiana co do ramki
+        fade_ins = map(lambda start: start + self.engine.block_size, self.starts) #rampa wejścia decka jak na żywo, nie na cały duży blok
+        points = map(self.engine.seconds_to_frames, np.concatenate(
+            [self.crossfader.times] + list(map(lambda automation: automation.times, self.volumes))))
+        return np.unique(np.clip(np.fromiter([*self.starts, *fade_ins, *points, total], dtype=np.int64), 0, total))
+
+    def render(self, output: str) -> dict: #blokami do pliku WAV 16 bit - pamięć stała niezależnie od długości miksu
+        total = self.total_frames()
+        boundaries = self.boundaries(total)
+        out = np.zeros((self.block_frames, self.engine.channels), dtype=np.float32)
+        started = time.perf_counter()
+        position = 0
+        peak_db, clipped = FLOOR_DB, 0
+        with wave.open(output, 'wb') as f:
+            f.setnchannels(self.engine.channels)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            while position < total:
+                end = min(position + self.block_frames, int(boundaries[np.searchsorted(boundaries, position, side='right')]))
+                for deck in filter(lambda deck: self.starts[deck] == position, range(len(self.decks))):
+                    self.engine.play(deck, self.engine.seconds_to_frames(self.decks[deck].get('offset', 0.0)))
+                seconds = end / self.sample_rate #cel na końcu bloku - silnik robi rampę od poprzedniej wartości
+                self.engine.set_crossfader(self.crossfader.at(seconds))
+                list(map(lambda deck: self.engine.set_volume(deck, self.volumes[deck].at(seconds)), range(len(self.decks))))
+                for deck in filter(lambda deck: self.engine.playing[deck], range(len(self.decks))):
+                    while self.streams[deck].fill():
+                        pass
+                block = out[:end - position]
+                self.engine.render_block(block)
+                levels = self.engine.meter.snapshot() #odczyt co blok - kolejka miernika nie rośnie przy dużych blokach
+                peak_db, clipped = max(peak_db, float(levels['peak_db'][-1])), clipped + int(levels['clips'][-1])
+                f.writeframes((block * 32767.0).astype('<i2').tobytes())
+                position = end
+        elapsed = time.perf_counter() - started
+        seconds = total / self.sample_rate
+        return {
+            'output': output,
+            'seconds': seconds,
+            'render_seconds': elapsed,
+            'realtime_factor': seconds / elapsed if elapsed > 0 else float('inf'),
+            'underruns': sum(map(lambda stream: stream.underruns, self.streams)),
+            'peak_db': peak_db, #master przed obcięciem - powyżej 0 dBFS plik jest przesterowany
+            'clipped_blocks': clipped
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render miksu do pliku WAV szybciej niż w czasie rzeczywistym")
+    parser.add_argument('mix', help="plik JSON z deckami, startami i automatyką głośności/crossfadera")
+    parser.add_argument('output', help="wyjściowy plik WAV")
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--block-frames', type=int, default=16384, help="ramki na blok renderowania")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        pygame.mixer.init(frequency=args.sample_rate, size=-16, channels=2) #dekodowanie formatów bez strumienia
+        with open(args.mix) as f:
+            mix = json.load(f)
+        renderer = OfflineRenderer(mix, sample_rate=args.sample_rate, block_frames=args.block_frames,
+                                   base_dir=os.path.dirname(os.path.abspath(args.mix)))
+        stats = renderer.render(args.output)
+        print(f"Rendered {stats['seconds']:.1f} s in {stats['render_seconds']:.2f} s "
+              f"({stats['realtime_factor']:.0f}x real time) -> {stats['output']}, "
+              f"peak {stats['peak_db']:.1f} dBFS" + (f", clipped in {stats['clipped_blocks']} blocks" if stats['clipped_blocks'] else ""))
+    except Exception as e:
+        print(f"Error rendering mix: {e}")
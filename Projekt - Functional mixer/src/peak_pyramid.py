@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class PeakPyramid: #obwiednia min/max/rms na wielu poziomach - poziom k to bloki po base_block * 2**k próbek
+    def __init__(self, levels, base_block, sample_rate, num_samples, peak=1.0):
+        self.levels = levels #lista tablic (bloki, 3): min, max, średni kwadrat
+        self.base_block = base_block
+        self.sample_rate = sample_rate
+        self.num_samples = num_samples
+        self.peak = peak #wartości są już znormalizowane do tego szczytu
+
+    @classmethod
+    def from_signal(cls, mono: np.ndarray, sample_rate: int, base_block=256, max_base_blocks=2 ** 19):
+        base_block = cls.pick_base_block(len(mono), base_block, max_base_blocks)
+        padded = np.zeros(-(-len(mono) // base_block) * base_block, dtype=np.float32)
+        padded[:len(mono)] = mono
+        blocks = padded.reshape(-1, base_block)
+        level0 = np.stack([blocks.min(axis=1), blocks.max(axis=1), np.square(blocks).mean(axis=1)], axis=1)
+        return cls.from_base_level(level0, base_block, sample_rate, len(mono))
+
+    @staticmethod
+    def pick_base_block(num_samples, base_block=256, max_base_blocks=2 ** 19) -> int: #potęga dwójki - pamięć ograniczona niezależnie od długości
+        while num_samples // base_block > max_base_blocks:
+            base_block *= 2
+        return base_block
+
+    @classmethod
+    def from_base_level(cls, level0: np.ndarray, base_block, sample_rate, num_samples, min_blocks=64):
+        peak = float(np.max(np.abs(level0[:, :2]))) if len(level0) else 0.0
+        if peak > 0:
+            level0 = level0 * np.array([1 / peak, 1 / peak, 1 / peak ** 2], dtype=np.float32)
+        levels = [level0.astype(np.float32)]
+        while len(levels[-1]) > min_blocks: #każdy wyższy poziom łączy pary bloków niższego
+            levels.append(cls._merge_pairs(levels[-1]))
+        return cls(levels, base_block, sample_rate, num_samples, peak)
+
+    @staticmethod
+    def _merge_pairs(level: np.ndarray) -> np.ndarray:
+        even = len(level) - len(level) % 2
+        pairs = level[:even].reshape(-1, 2, 3)
+        merged = np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1), pairs[:, :, 2].mean(axis=1)], axis=1)
+        return np.concatenate([merged, level[even:]]) if even < len(level) else merged
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / self.sample_rate
+
+    def columns(self, start: float, end: float, num_columns: int): #N kolumn dla zakresu [start, end] sekund w O(N)
+        num_columns = max(1, int(num_columns))
+        s0 = min(max(0.0, start * self.sample_rate), self.num_samples)
+        s1 = min(max(s0 + 1, end * self.sample_rate), self.num_samples)
+        samples_per_column = max((s1 - s0) / num_columns, 1e-9)
+        level_index = int(np.clip(np.floor(np.log2(max(samples_per_column / self.base_block, 1))), 0, len(self.levels) - 1))
+        level, block = self.levels[level_index], self.base_block << level_index
+        times = (s0 + (np.arange(num_columns) + 0.5) * samples_per_column) / self.sample_rate
+
+        b0 = min(int(s0 // block), len(level) - 1)
+        b1 = min(len(level), int(np.ceil(s1 / block)))
+        segment = level[b0:max(b1, b0 + 1)]
+        if len(segment) <= num_columns: #zoom głębszy niż poziom 0 - każda kolumna bierze najbliższy blok
+            idx = np.clip((times * self.sample_rate / block).astype(np.int64) - b0, 0, len(segment) - 1)
+            values = segment[idx]
+            return times, values[:, 0], values[:, 1], np.sqrt(values[:, 2])
+        #granice kolumn od bezwzględnej pozycji w utworze - ten sam zakres daje te same kolumny niezależnie od okna
+        starts = np.clip((s0 + np.arange(num_columns) * samples_per_column) // block - b0, 0, len(segment) - 1).astype(np.int64)
+        #blok na granicy z następną kolumną należy do niej (jak przy starts) - poza końcem utworu bierzemy resztę
+        end = len(segment) if s1 >= self.num_samples else max(int(s1 // block) - b0, int(starts[-1]) + 1)
+        counts = np.maximum(np.diff(np.append(starts, end)), 1)
+        segment = segment[:end]
+        mins = np.minimum.reduceat(segment[:, 0], starts)
+        maxs = np.maximum.reduceat(segment[:, 1], starts)
+        rms = np.sqrt(np.add.reduceat(segment[:, 2], starts) / counts)
+        return times, mins, maxs, rms
+
+    def nbytes(self) -> int:
+        return sum(map(lambda level: level.nbytes, self.levels))
+
+    def to_arrays(self) -> dict: #do zapisu w cache - poziomy wyższe odtwarzamy przy odczycie
+        return {
+            'level0': self.levels[0] * np.array([self.peak, self.peak, self.peak ** 2], dtype=np.float32),
+            'meta': np.array([self.base_block, self.sample_rate, self.num_samples], dtype=np.int64)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        base_block, sample_rate, num_samples = map(int, arrays['meta'])
+        return cls.from_base_level(arrays['level0'], base_block, sample_rate, num_samples)
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class Scheduler: #jeden wątek w tle - śpi do najbliższego terminu albo do notify(), zamiast kilku pętli z sleep
+    def __init__(self, shutdown_event: threading.Event):
+        self.shutdown_event = shutdown_event
+        self.condition = threading.Condition()
+        self.consumers = []
+        self.thread = None
+        self._pending = False
+        self.wakeups = 0
+        self.cpu_time = 0.0 #czas CPU zużyty przez wątek schedulera (s)
+
+    def register(self, name, callback, interval, is_active=lambda: True): #is_active musi być tani i bez locków
+        self.consumers.append({
+            'name': name,
+            'callback': callback,
+            'interval': interval,
+            'is_active': is_active,
+            'next_due': 0.0
+        })
+
+    def notify(self): #zmiana stanu - budzimy wątek, żeby sprawdził kto ma coś do zrobienia
+        with self.condition:
+            self._pending = True
+            self.condition.notify()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="Scheduler")
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown_event.set()
+        self.notify()
+
+    def _run(self):
+        while not self.shutdown_event.is_set():
+            cpu_started = time.thread_time()
+            deadline = self._run_due_consumers(time.monotonic())
+            self.cpu_time += time.thread_time() - cpu_started
+            with self.condition:
+                if not self._pending and not self.shutdown_event.is_set():
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    self.condition.wait(timeout) #None - nic nie gra, śpimy aż ktoś zawoła notify()
+                self._pending = False
+            self.wakeups += 1
+
+    def _run_due_consumers(self, now):
+        deadline = None
+        for consumer in self.consumers:
+            if not consumer['is_active']():
+                consumer['next_due'] = 0.0 #po aktywacji odpalamy od razu
+                continue
+            if consumer['next_due'] <= now:
+                try:
+                    consumer['callback']()
+                except Exception as e:
+                    print(f"Error in scheduler consumer {consumer['name']}: {e}")
+                consumer['next_due'] = now + consumer['interval']
+            deadline = consumer['next_due'] if deadline is None else min(deadline, consumer['next_due'])
+        return deadline
+
+    def stats(self) -> dict:
+        return {'wakeups': self.wakeups, 'cpu_time': self.cpu_time}
@@ -0,0 +1,169 @@
+import time
+import tkinter as tk
+from collections import deque
+import numpy as np
+from waveform_display import BEATS_PER_BAR
+
+TRACK_RGB = [(0, 0, 255), (255, 0, 0), (0, 139, 139), (128, 0, 128), #te same kolory co w WaveformDisplay.track_colors
+             (139, 69, 19), (255, 0, 255), (128, 128, 0), (0, 0, 128)]
+BACKGROUND = (255, 255, 255)
+BEAT_RGB = (205, 205, 205)
+DOWNBEAT_RGB = (120, 120, 120)
+SEPARATOR_RGB = (170, 170, 170)
+PLAYHEAD_RGB = {'playing': (0, 160, 0), 'paused': (255, 165, 0), 'stopped': (255, 0, 0)}
+ZOOM_RANGE = (2.0, 32.0) #widoczne sekundy (czasu rzeczywistego) na całą szerokość
+
+
+def _blend(color, alpha) -> tuple: #kolor na białym tle z przezroczystością - jak alpha w fill_between
+    return tuple(map(lambda c: int(round(255 + (c - 255) * alpha)), color))
+
+
+class ScrollingWaveformView: #przybliżony widok z głowicą na środku - obwiednia rasteryzowana w numpy, bez artystów matplotlib
+    def __init__(self, app, seconds=8.0, deck_height=64, width=800):
+        self.app = app
+        self.num_decks = app.num_decks
+        self.seconds = seconds #ile sekund odtwarzania mieści się na szerokości - ta sama skala dla wszystkich decków
+        self.deck_height = deck_height
+        self.image = None
+        self.label = None
+        #indeksy palety: 0 tło, 1 beat, 2 pierwszy beat taktu, 3 obwiednia min/max, 4 rms
+        self.palettes = list(map(lambda i: np.array([BACKGROUND, BEAT_RGB, DOWNBEAT_RGB, _blend(TRACK_RGB[i % len(TRACK_RGB)], 0.4),
+                                                     _blend(TRACK_RGB[i % len(TRACK_RGB)], 0.8)], dtype=np.uint8),
+                                 range(self.num_decks)))
+        self.amplitudes = (1.0 - (2.0 * np.arange(deck_height) + 1.0) / deck_height)[:, None] #amplituda środka każdego wiersza
+        self.frame_times = deque(maxlen=300)
+        self.requested_width = width #z <Configure> w wątku tk - bufory zmienia dopiero wątek renderujący
+        self._drawn = None #snapshot stanu z ostatniej klatki - inny obiekt = coś się zmieniło
+        self._pending = False #klatka czeka na wyświetlenie w tk
+        self.resize(width)
+
+    def resize(self, width):
+        self.width = max(64, int(width))
+        self.pixels = np.zeros((self.num_decks * self.deck_height, self.width, 3), dtype=np.uint8) #przesuwany bufor obwiedni
+        self.frame = np.empty_like(self.pixels) #bufor + głowica - z niego powstaje PPM
+        self.header = f"P6 {self.width} {len(self.pixels)} 255\n".encode()
+        self.origins = [None] * self.num_decks #bezwzględny numer kolumny na lewej krawędzi bufora
+        self.keys = [None] * self.num_decks #(obwiednia, beaty, sekundy na kolumnę) - zmiana = przerysowanie decka
+        self.beats = list(map(lambda _: np.zeros(0), range(self.num_decks)))
+        self._drawn = None
+
+    def setup(self, parent, row): #wątek tk - etykieta z obrazem, szerokość z gridu
+        self.image = tk.PhotoImage(width=self.width, height=len(self.pixels))
+        self.label = tk.Label(parent, image=self.image, width=1, height=len(self.pixels), borderwidth=0, anchor='w')
+        self.label.grid(row=row, column=0, columnspan=2, sticky="ew", pady=(0, 10))
+        self.label.bind('<Configure>', self._on_configure)
+        self.label.bind('<MouseWheel>', lambda event: self.zoom(0.8 if event.delta > 0 else 1.25))
+        self.label.bind('<Button-4>', lambda event: self.zoom(0.8)) #kółko myszy na X11
+        self.label.bind('<Button-5>', lambda event: self.zoom(1.25))
+
+    def _on_configure(self, event):
+        if event.width > 1 and event.width != self.requested_width:
+            self.requested_width = event.width
+            self.app.scheduler.notify()
+
+    def zoom(self, factor): #zmiana skali - sekundy na kolumnę w kluczu decka, więc przerysowanie całości
+        self.seconds = min(ZOOM_RANGE[1], max(ZOOM_RANGE[0], self.seconds * factor))
+        self._drawn = None
+        self.app.scheduler.notify()
+
+    def needs_frame(self) -> bool: #tanie i bez locków - is_active schedulera
+        return self.image is not None and (self.app.audio_state.any_playing() or self._drawn is not self.app.audio_state.snapshot()
+                                           or self.requested_width != self.width)
+
+    def render_frame(self): #wątek schedulera - numpy poza wątkiem tk, do tk trafiają tylko gotowe bajty PPM
+        if self._pending: #poprzednia klatka jeszcze niewyświetlona - nie dokładamy kolejnych
+            return
+        started = time.perf_counter()
+        if self.requested_width != self.width:
+            self.resize(self.requested_width)
+        decks = self.app.audio_state.snapshot()
+        self._drawn = decks
+        center = self.width // 2
+        for track_index, deck in enumerate(decks):
+            position = self._position(track_index, deck)
+            self._update_deck(track_index, deck, position)
+            rows = slice(track_index * self.deck_height, (track_index + 1) * self.deck_height)
+            self.frame[rows] = self.pixels[rows]
+            state = 'playing' if deck.playing else 'paused' if deck.paused else 'stopped'
+            self.frame[rows, center] = PLAYHEAD_RGB[state]
+        self.frame[self.deck_height - 1::self.deck_height] = SEPARATOR_RGB
+        data = self.header + self.frame.tobytes()
+        self.frame_times.append(time.perf_counter() - started)
+        self.app.metrics.observe('scroll_frame_time', self.frame_times[-1])
+        self._pending = True
+        try:
+            self.app.root.after_idle(self._present, data)
+        except Exception as e: #zamykanie okna albo błąd Tcl - _present nie przyjdzie, następna klatka musi móc wyjść
+            self._pending = False
+            print(f"Error scheduling scrolling waveform frame: {e}")
+
+    def _position(self, track_index, deck) -> float: #grający deck - prosto z silnika, płynniej niż current_position co 16 ms
+        if deck.playing:
+            engine = self.app.mixer_engine
+            return engine.frames_to_seconds(engine.get_position(track_index))
+        return deck.current_position
+
+    def _present(self, data): #wątek tk - jedna podmiana zawartości obrazu, bez tworzenia obiektów
+        try:
+            if self.image.width() != self.width: #po zmianie rozmiaru - nowe wymiary razem z danymi
+                self.image.configure(width=self.width, height=len(self.pixels))
+            self.image.configure(data=data, format='PPM')
+        except Exception as e:
+            print(f"Error presenting scrolling waveform: {e}")
+        finally:
+            self._pending = False
+
+    def _update_deck(self, track_index, deck, position): #przesunięcie bufora o tyle kolumn, ile przesunęła się głowica
+        block = self.pixels[track_index * self.deck_height:(track_index + 1) * self.deck_height]
+        if deck.waveform is None or deck.duration <= 0:
+            if self.keys[track_index] is not None:
+                block[:] = BACKGROUND
+                self.keys[track_index], self.origins[track_index] = None, None
+            elif self.origins[track_index] is None: #pierwsza klatka po utworzeniu bufora
+                block[:] = BACKGROUND
+                self.origins[track_index] = 0
+            return
+        column_seconds = self.seconds * deck.tempo / self.width #sekundy utworu na kolumnę - zsynchronizowane decki mają te same odstępy beatów
+        key = (deck.waveform, deck.beat_times, column_seconds)
+        if key != self.keys[track_index]:
+            self.keys[track_index], self.origins[track_index] = key, None
+            self.beats[track_index] = np.sort(np.asarray(deck.beat_times, dtype=np.float64))
+        origin = int(position // column_seconds) - self.width // 2
+        previous = self.origins[track_index]
+        shift = self.width if previous is None else origin - previous
+        if shift == 0:
+            return
+        if 0 < shift < self.width: #odtwarzanie - stare kolumny w lewo, rysujemy tylko nowe z prawej
+            block[:, :-shift] = block[:, shift:]
+            self._draw_columns(track_index, deck, origin + self.width - shift, block[:, self.width - shift:])
+        elif -self.width < shift < 0: #cofnięcie o kawałek - nowe kolumny z lewej
+            block[:, -shift:] = block[:, :shift]
+            self._draw_columns(track_index, deck, origin, block[:, :-shift])
+        else: #skok dalej niż szerokość widoku
+            self._draw_columns(track_index, deck, origin, block)
+        self.origins[track_index] = origin
+
+    def _draw_columns(self, track_index, deck, first, out): #kolumny [first, first + szerokość out) -> piksele przez paletę
+        column_seconds, count = self.keys[track_index][2], out.shape[1]
+        index = np.zeros((self.deck_height, count), dtype=np.uint8)
+        beats = self.beats[track_index]
+        at = np.searchsorted(beats, (first + np.arange(count + 1)) * column_seconds) #beaty w kolumnie - wyszukiwanie binarne
+        has_beat = at[1:] > at[:-1]
+        index[:, has_beat] = 1
+        index[:, has_beat & (at[:-1] % BEATS_PER_BAR == 0)] = 2
+        lo = max(first, 0)
+        hi = min(first + count, int(deck.waveform.duration // column_seconds)) #tylko pełne kolumny wewnątrz utworu
+        if hi > lo: #koszt zależy od liczby kolumn, nie od długości utworu - piramida wybiera poziom pod szerokość kolumny
+            _, mins, maxs, rms = deck.waveform.columns(lo * column_seconds, hi * column_seconds, hi - lo)
+            part = index[:, lo - first:hi - first]
+            part[(self.amplitudes >= mins) & (self.amplitudes <= maxs)] = 3
+            part[np.abs(self.amplitudes) <= rms] = 4
+        out[:] = self.palettes[track_index][index]
+
+    def frame_stats(self) -> dict:
+        times = list(self.frame_times) or [0.0]
+        return {
+            'avg_ms': 1000 * sum(times) / len(times),
+            'max_ms': 1000 * max(times),
+            'frames': len(self.frame_times)
+        }
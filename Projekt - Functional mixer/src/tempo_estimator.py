@@ -0,0 +1,127 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class TempoEstimator: #bpm liczone przyrostowo z kolejnych bloków audio - wynik wstępny po kilku sekundach, potem doprecyzowany
+    def __init__(self, sample_rate, analysis_rate=11025, n_fft=1024, hop_length=256, window_seconds=12.0,
+                 min_bpm=40.0, max_bpm=220.0):
+        self.decimation = max(1, int(round(sample_rate / analysis_rate))) #proste uśrednianie - do obwiedni onsetów wystarczy
+        self.analysis_rate = sample_rate / self.decimation
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.frame_rate = self.analysis_rate / hop_length #ramki obwiedni na sekundę
+        self.window_seconds = window_seconds
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self.max_bin = int(5000 * n_fft / self.analysis_rate) #wyżej są głównie talerze i szum - gorszy puls
+        self._pending = np.zeros(0, dtype=np.float32) #próbki czekające na pełną ramkę decymacji/fft
+        self._stft_tail = np.zeros(0, dtype=np.float32) #próbki po decymacji, jeszcze bez pełnej ramki fft
+        self._previous = None #widmo poprzedniej ramki - flux liczony między blokami bez przerwy
+        self._chunks = []
+        self._envelope = np.zeros(0, dtype=np.float32)
+
+    @property
+    def seconds(self) -> float: #ile audio już przeanalizowano
+        return (len(self._envelope) + sum(map(len, self._chunks))) / self.frame_rate
+
+    def envelope(self) -> np.ndarray:
+        if self._chunks:
+            self._envelope = np.concatenate([self._envelope, *self._chunks])
+            self._chunks = []
+        return self._envelope
+
+    def feed(self, mono: np.ndarray): #kolejny blok mono float32 w oryginalnym sample rate
+        samples = np.concatenate([self._pending, mono]) if len(self._pending) else mono
+        usable = len(samples) - len(samples) % self.decimation
+        decimated = samples[:usable].reshape(-1, self.decimation).mean(axis=1) if self.decimation > 1 else samples
+        self._pending = samples[usable:]
+        self._stft_tail = np.concatenate([self._stft_tail, decimated])
+        if len(self._stft_tail) < self.n_fft:
+            return
+        frames = sliding_window_view(self._stft_tail, self.n_fft)[::self.hop_length]
+        spectrum = np.log1p(100.0 * np.abs(np.fft.rfft(frames * self.window, axis=1))[:, :self.max_bin])
+        previous = spectrum[:1] if self._previous is None else self._previous[None, :]
+        flux = np.maximum(np.diff(np.concatenate([previous, spectrum]), axis=0), 0.0).sum(axis=1)
+        self._chunks.append(flux.astype(np.float32))
+        self._previous = spectrum[-1]
+        self._stft_tail = self._stft_tail[len(frames) * self.hop_length:]
+
+    def _tempo(self, envelope: np.ndarray) -> tuple: #autokorelacja obwiedni -> (bpm, wyrazistość piku 0..1)
+        min_lag = int(60.0 * self.frame_rate / self.max_bpm)
+        max_lag = min(int(60.0 * self.frame_rate / self.min_bpm), len(envelope) // 2)
+        if max_lag <= min_lag + 2:
+            return None, 0.0
+        centered = envelope - envelope.mean()
+        spectrum = np.fft.rfft(centered, 2 * len(centered))
+        acf = np.fft.irfft(np.abs(spectrum) ** 2)[:len(centered)]
+        if acf[0] <= 0:
+            return None, 0.0
+        lags = np.arange(min_lag, max_lag)
+        harmonics = acf[lags] + 0.5 * acf[np.minimum(lags * 2, len(acf) - 1)] #beat potwierdzony też na podwójnym okresie
+        bpms = 60.0 * self.frame_rate / lags
+        prior = np.exp(-0.5 * np.log2(bpms / 120.0) ** 2) #utwory taneczne - najczęściej okolice 120 bpm
+        best = int(np.argmax(harmonics * prior))
+        lag = float(lags[best])
+        if 0 < best < len(lags) - 1: #interpolacja paraboliczna - bpm dokładniejszy niż jedna ramka obwiedni
+            a, b, c = harmonics[best - 1:best + 2]
+            denominator = a - 2 * b + c
+            lag += 0.5 * (a - c) / denominator if denominator != 0 else 0.0
+        floor = np.median(acf[lags])
+        clarity = float(np.clip((acf[lags[best]] - floor) / (acf[0] - floor), 0.0, 1.0)) if acf[0] > floor else 0.0
+        return 60.0 * self.frame_rate / lag, clarity
+
+    def provisional(self) -> tuple: #szybki wynik z tego, co już przeanalizowano
+        bpm, clarity = self._tempo(self.envelope())
+        return (round(float(bpm), 1) if bpm else None), round(clarity, 2)
+
+    def segments(self, fallback_bpm: float) -> tuple: #lokalne tempo w oknach -> odcinki stałego tempa + stabilność 0..1
+        envelope = self.envelope()
+        window = int(self.window_seconds * self.frame_rate)
+        starts = range(0, max(1, len(envelope) - window + 1), window // 2)
+        local = list(map(lambda start: self._tempo(envelope[start:start + window])[0], starts))
+        windows = list(filter(lambda item: item[1] is not None, zip(starts, local)))
+        if not windows:
+            return [(0.0, len(envelope) / self.frame_rate, fallback_bpm)], 0.0
+        #pojedyncze okno potrafi przeskoczyć o oktawę - sprowadzamy wszystkie do oktawy mediany okien
+        reference = float(np.median(list(map(lambda item: item[1], windows))))
+        folded = list(map(lambda item: (item[0], item[1] * 2.0 ** np.round(np.log2(reference / item[1]))), windows))
+        runs = []
+        for start, bpm in folded:
+            if runs and abs(bpm / runs[-1][2] - 1.0) < 0.03:
+                runs[-1] = (runs[-1][0], runs[-1][1] + 1, (runs[-1][2] * runs[-1][1] + bpm) / (runs[-1][1] + 1))
+            else:
+                runs.append((start, 1, bpm))
+        if len(runs) > 1: #pojedyncze okno odstające od sąsiadów to raczej przejście/break niż zmiana tempa
+            runs = list(filter(lambda run: run[1] > 1, runs)) or runs
+        run_bpms = list(map(lambda run: run[2], runs))
+        stable = sum(map(lambda item: any(map(lambda bpm: abs(item[1] / bpm - 1.0) < 0.03, run_bpms)), folded))
+        starts = [0.0] + list(map(lambda run: run[0] / self.frame_rate, runs[1:]))
+        ends = starts[1:] + [len(envelope) / self.frame_rate]
+        segments = list(zip(starts, ends, run_bpms))
+        return segments, stable / len(folded)
+
+    def finish(self) -> dict: #pełny wynik: bpm dominującego odcinka, beaty w każdym odcinku osobno, pewność z danych
+        envelope = self.envelope()
+        global_bpm, clarity = self._tempo(envelope) #cały utwór naraz - wyrazistość pulsu do pewności
+        if global_bpm is None:
+            return {'bpm': None, 'beats': [], 'confidence': 0.0, 'segments': []}
+        segments, stability = self.segments(global_bpm)
+        dominant = max(segments, key=lambda segment: segment[1] - segment[0])
+        beats = np.concatenate([np.zeros(0)] + list(map(self._beats, segments)))
+        return {
+            'bpm': round(float(dominant[2]), 1),
+            'beats': beats.tolist(),
+            'confidence': round(clarity * stability, 2),
+            'segments': segments
+        }
+
+    def _beats(self, segment) -> np.ndarray: #programowanie dynamiczne librosa na naszej obwiedni, ze stałym tempem odcinka
+        import librosa
+        start, end, bpm = segment
+        first, last = int(start * self.frame_rate), int(end * self.frame_rate)
+        if last - first < 4:
+            return np.zeros(0)
+        _, frames = librosa.beat.beat_track(onset_envelope=self.envelope()[first:last], sr=self.analysis_rate,
+                                            hop_length=self.hop_length, bpm=bpm)
+        return start + (np.asarray(frames) * self.hop_length + self.n_fft / 2) / self.analysis_rate
@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def tempo_ratio(bpm: float, reference_bpm: float) -> float: #tempo decka zrównujące bpm z referencją; pół/podwójne tempo składamy do oktawy
+    ratio = reference_bpm / bpm
+    return float(ratio * 2.0 ** -np.round(np.log2(ratio)))
+
+
+def beat_offset(beat_times, bpm: float, seconds: float) -> float: #sekundy utworu od ostatniego beatu; poza zakresem analizy siatka ekstrapolowana
+    beats = np.asarray(beat_times, dtype=np.float64)
+    anchor = beats[max(int(np.searchsorted(beats, seconds, side='right')) - 1, 0)]
+    return float((seconds - anchor) % (60.0 / bpm))
+
+
+def aligned_position(reference, target) -> float: #reference/target - (beat_times, bpm, tempo, sekunda utworu)
+    ref_beats, ref_bpm, ref_tempo, ref_seconds = reference
+    beats, bpm, tempo, seconds = target
+    grid = min(60.0 / (ref_bpm * ref_tempo), 60.0 / (bpm * tempo)) #wspólna siatka w czasie rzeczywistym - krótszy z okresów
+    ref_phase = beat_offset(ref_beats, ref_bpm, ref_seconds) / ref_tempo
+    phase = beat_offset(beats, bpm, seconds) / tempo
+    shift = (ref_phase - phase + grid / 2) % grid - grid / 2 #najkrótsze przesunięcie, w przód albo w tył
+    return seconds + shift * tempo
@@ -0,0 +1,44 @@
+import itertools
+import threading
+
+COALESCE = { #typ -> (klucz, deck z danych); dla tego samego klucza liczy się tylko najnowsza aktualizacja
+    'bpm_update': ('bpm', lambda data: data[0]), #wynik końcowy zastępuje też wstępny z bpm_progress
+    'bpm_progress': ('bpm', lambda data: data[0]),
+    'file_loaded': ('file', lambda data: data[0]),
+    'waveform_update': ('waveform', lambda data: data),
+    'stop_track': ('stop', lambda data: data),
+    'prefetch_update': ('prefetch', lambda data: None),
+    'meter_update': ('meters', lambda data: None) #wszystkie mierniki w jednym odczycie
+}
+
+
+class UpdateBus: #aktualizacje gui zbierane po kluczu - nadawca nigdy nie czeka, gui dostaje paczkę raz na tick
+    def __init__(self):
+        self.lock = threading.Lock() #trzymany tylko na czas wpisu do słownika albo podmiany
+        self._pending = {} #klucz -> (typ, dane, czas nadania); kolejność wg ostatniego nadania
+        self._sequence = itertools.count() #unikalne klucze dla typów bez scalania (np. błędy)
+        self.posted = 0
+        self.coalesced = 0
+
+    def key(self, update_type, data):
+        if update_type in COALESCE:
+            name, deck = COALESCE[update_type]
+            return name, deck(data)
+        return update_type, next(self._sequence)
+
+    def post(self, update_type, data, enqueued) -> bool: #True - zastąpiła starszą aktualizację z tym samym kluczem
+        key = self.key(update_type, data)
+        with self.lock:
+            replaced = self._pending.pop(key, None) is not None
+            self._pending[key] = (update_type, data, enqueued)
+            self.posted += 1
+            self.coalesced += replaced
+        return replaced
+
+    def drain(self) -> list: #wszystko, co czeka - bus zostaje pusty
+        with self.lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+    def pending(self) -> int: #len słownika bez locka - wystarczy do is_active schedulera
+        return len(self._pending)
@@ -1,6 +1,4 @@
-import threading
 import time
-import queue
 import os
 from tkinter import messagebox
 from functools import wraps
@@ -10,9 +8,14 @@ class Utils:
     def __init__(self, app):
         self.app = app
         self.gui_update_throttle = 0.033
-        self.last_gui_update = 0
         self.position_update_throttle = 0.016
-        self.last_position_update = 0
+        self.idle_report_interval = 5.0
+        self._last_idle_report = None
+        self._frame_pending = False
+        self._batch_pending = False #paczka aktualizacji czeka w tk - nowe zbieramy w busie
+        self.meter_tail = 45 #odczyty po zatrzymaniu (~1.5 s) - znaczniki szczytu i przesterowania zdążą opaść
+        self._meter_ticks = 0
+        self._meter_pending = False #odczyt czeka w busie - kolejny scaliłby go i zgubił szczyty, więc poziomy zbiera dalej miernik
 
     #dekorator do obsługi błędów
     def handle_audio_errors(func):
@@ -21,72 +24,97 @@ class Utils:
             try:
                 return func(self, *args, **kwargs)
             except Exception as e:
-                self.app.update_queue.put(('error', f"Error in {func.__name__}: {str(e)}"))
+                self.post_update('error', f"Error in {func.__name__}: {str(e)}")
                 return None
         return wrapper
     #przechowuje wyjątki i wrzuca je na kolejkę gui
 
-    def start_background_threads(self): #uruchamia 3 wątki 
-        self.position_thread = threading.Thread(#aktualizacja czasu odświerzania 16ms
-            target=self._position_updater_optimized,
-            daemon=True, #specjalny tryb pracy wątku, bez wględu na taki wątek nasz program może się zakończyć (caly czas działa w tle)
-            name="PositionUpdater"
-        )
-        self.position_thread.start()
+    def start_background_threads(self): #jeden scheduler zamiast 3 wątków - każdy konsument budzony tylko gdy ma pracę
+        scheduler = self.app.scheduler
+        scheduler.register('positions', self._update_positions, self.position_update_throttle,
+                           is_active=self._any_playing) #aktualizacja pozycji co 16ms, tylko gdy coś gra
+        scheduler.register('gui_updates', self._process_gui_updates, 0.016,
+                           is_active=lambda: self.app.update_bus.pending() and not self._batch_pending) #budzony przez post_update
+        scheduler.register('waveform', self._schedule_waveform_updates, self.gui_update_throttle,
+                           is_active=self.app.waveform_display.needs_frame) #klatka co 33ms gdy coś gra albo się zmieniło
+        scheduler.register('scrolling', self.app.scrolling_view.render_frame, 1 / 60,
+                           is_active=self.app.scrolling_view.needs_frame) #przybliżony widok - 60 fps gdy coś gra
+        scheduler.register('meters', self._publish_meters, 1 / 30,
+                           is_active=lambda: self._any_playing() or self._meter_ticks > 0) #poziomy 30 razy na sekundę
+        if self.app.idle_report:
+            scheduler.register('idle_report', self._report_idle_cpu, self.idle_report_interval)
+        if self.app.metrics.enabled and self.app.metrics.dump_path:
+            scheduler.register('metrics_dump', self.app.metrics.dump, self.app.metrics.dump_interval)
+        scheduler.start()
 
-        self.gui_update_thread = threading.Thread(#przetworzenie kolejki aktualizaji gui
-            target=self._process_gui_updates,
-            daemon=True,
-            name="GUIUpdater"
-        )
-        self.gui_update_thread.start()
+    def post_update(self, update_type, data): #wpis do busa aktualizacji gui (bez czekania) i budzenie schedulera
+        enqueued = time.perf_counter()
+        replaced = self.app.update_bus.post(update_type, data, enqueued)
+        if self.app.metrics.enabled:
+            self.app.metrics.observe('update_bus.post', time.perf_counter() - enqueued)
+            self.app.metrics.increment(f"update_bus.posted.{update_type}")
+            if replaced:
+                self.app.metrics.increment(f"update_bus.coalesced.{update_type}")
+        self.app.scheduler.notify()
 
-        self.waveform_scheduler = threading.Thread(#ustala odświerzania waveformów co 33ms
-            target=self._schedule_waveform_updates,
-            daemon=True,
-            name="WaveformScheduler"
-        )
-        self.waveform_scheduler.start()
+    def _any_playing(self) -> bool: #odczyt opublikowanej krotki - bez locka
+        return self.app.audio_state.any_playing()
 
-    def _position_updater_optimized(self): #sprawdza czy track leci i ile czasu trwania już mineło
-        while not self.app.shutdown_event.is_set():
-            try:
-                current_time = time.time()
-                if current_time - self.last_position_update < self.position_update_throttle:
-                    time.sleep(0.001)
-                    continue
-                self.last_position_update = current_time
+    def _publish_meters(self): #poziomy zebrane przez callback audio od poprzedniego odczytu - do gui przez bus
+        if self._meter_pending:
+            return
+        self._meter_ticks = self.meter_tail if self._any_playing() else max(0, self._meter_ticks - 1)
+        self._meter_pending = True
+        self.post_update('meter_update', self.app.mixer_engine.meter.snapshot())
 
-                with self.app.state_lock:
-                    for i in range(2):
-                        if self.app.audio_state.state['playing'][i]:
-                            elapsed = current_time - self.app.audio_state.state['start_times'][i]
-                            self.app.audio_state.state['current_positions'][i] = elapsed #jeśli jest koniec tracka to kończymy odtwarzanie
-                            if (elapsed >= self.app.audio_state.state['durations'][i] and
-                                    self.app.audio_state.state['durations'][i] > 0):
-                                self.app.update_queue.put(('stop_track', i))
-                time.sleep(0.005)
-            except Exception as e:
-                print(f"Error in position_updater_optimized: {e}")
-                time.sleep(0.1)
+    def _update_positions(self): #pozycja z liczby wyrenderowanych ramek
+        engine = self.app.mixer_engine
+        for i, deck in enumerate(self.app.audio_state.snapshot()):
+            if deck.playing:
+                seconds = engine.frames_to_seconds(engine.get_position(i))
+                #pauza/stop z gui w międzyczasie wygrywa - nie nadpisujemy jej starą pozycją
+                self.app.audio_state.update(i, when=lambda current: current.playing, current_position=seconds)
+                if engine.finished[i]: #silnik doszedł do końca pcm - kończymy odtwarzanie
+                    self.post_update('stop_track', i)
 
-    def _process_gui_updates(self): # czyta kolejke update_queue - podaje dane do aktualizacje do gui
-        while not self.app.shutdown_event.is_set():
-            try:
-                updates_processed = 0
-                while not self.app.update_queue.empty() and updates_processed < 10:
-                    try:
-                        update_type, data = self.app.update_queue.get_nowait()
-                        self.app.root.after_idle(self._execute_gui_update, update_type, data) # tkinter nie jest w pełni threadsafe
-                        updates_processed += 1                                                #dlatego używamy after_idle -wykonywanie aktualizaji w głownym wątku
-                    except queue.Empty:
-                        break
-                time.sleep(0.016)
-            except Exception as e:
-                print(f"Error in _process_gui_updates: {e}")
-                time.sleep(0.1)
+    def _process_gui_updates(self): # zabiera z busa wszystko, co się zebrało w tym ticku - jedna paczka do gui
+        if self._batch_pending: #poprzednia paczka jeszcze nie wykonana - kolejne aktualizacje scalają się w busie
+            return
+        batch = self.app.update_bus.drain()
+        if batch:
+            self._batch_pending = True
+            self.app.root.after_idle(self._execute_gui_batch, batch) # tkinter nie jest w pełni threadsafe
+                                                                     #dlatego używamy after_idle -wykonywanie aktualizaji w głownym wątku
+
+    def _execute_gui_batch(self, batch): #wątek tk - cała paczka w jednym wywołaniu
+        try:
+            for update_type, data, enqueued in batch:
+                self._execute_gui_update(update_type, data, enqueued)
+        finally:
+            self._batch_pending = False
+            if self.app.metrics.enabled:
+                self.app.metrics.increment('update_bus.batches')
+                self.app.metrics.increment('update_bus.delivered', len(batch)) #delivered / batches - średnia wielkość paczki
+            if self.app.update_bus.pending(): #w trakcie paczki przyszły nowe - budzimy scheduler
+                self.app.scheduler.notify()
 
-    def _execute_gui_update(self, update_type, data): #faktyczna aktualizacja danych do gui
+    def _report_idle_cpu(self): #tryb --idle-report: zużycie CPU procesu i liczba wybudzeń schedulera
+        now, cpu = time.monotonic(), time.process_time()
+        if self._last_idle_report is not None:
+            last_now, last_cpu, last_wakeups = self._last_idle_report
+            wall = now - last_now
+            wakeups = self.app.scheduler.wakeups - last_wakeups
+            frames = self.app.waveform_display.frame_stats()
+            scrolling = self.app.scrolling_view.frame_stats()
+            print(f"Idle report: CPU {100 * (cpu - last_cpu) / wall:.2f}%, "
+                  f"scheduler wakeups {wakeups / wall:.1f}/s, playing: {self._any_playing()}, "
+                  f"frame {frames['avg_ms']:.2f} ms avg / {frames['max_ms']:.2f} ms max, "
+                  f"scrolling frame {scrolling['avg_ms']:.2f} ms avg / {scrolling['max_ms']:.2f} ms max")
+        self._last_idle_report = (now, cpu, self.app.scheduler.wakeups)
+
+    def _execute_gui_update(self, update_type, data, enqueued=None): #faktyczna aktualizacja danych do gui
+        if enqueued is not None and self.app.metrics.enabled: #od post_update do wykonania w wątku tk
+            self.app.metrics.observe(f"update_bus.latency.{update_type}", time.perf_counter() - enqueued)
         try:
             if update_type == 'error':
                 messagebox.showerror("Audio Error", data)
@@ -96,39 +124,35 @@ class Utils:
                 track_idx, bpm, confidence = data
                 self.app.gui.bpm_labels[track_idx].config(text=f"BPM: {bpm if bpm else 'N/A'}")
                 self.app.gui.confidence_labels[track_idx].config(text=f"Conf: {int(confidence * 100)}%")
+                self.app.waveform_display.update_beat_grid(track_idx) #beaty dochodzą razem z końcowym bpm
+            elif update_type == 'bpm_progress': #wynik wstępny - analiza wciąż trwa
+                track_idx, bpm, confidence = data
+                self.app.gui.bpm_labels[track_idx].config(text=f"BPM: ~{bpm}")
+                self.app.gui.confidence_labels[track_idx].config(text=f"Conf: {int(confidence * 100)}%")
             elif update_type == 'file_loaded':
                 track_idx, filename = data
                 self.app.gui.file_labels[track_idx].config(text=os.path.basename(filename)[:30])
+                self.app.waveform_display.update_beat_grid(track_idx) #siatka poprzedniego utworu znika od razu
+            elif update_type == 'prefetch_update':
+                self.app.gui.update_prefetch_label()
+            elif update_type == 'meter_update':
+                self._meter_pending = False
+                self.app.gui.update_meters(data)
             elif update_type == 'waveform_update':
                 track_idx = data
                 self.app.waveform_display.update_waveform_static(track_idx)
         except Exception as e:
             print(f"Error executing GUI update: {e}")
 
-    def _schedule_waveform_updates(self):# ustala odświerzania waveformów co 33ms gdy coś jest odtwarzanie
-        while not self.app.shutdown_event.is_set():
-            try:
-                current_time = time.time()
-                if current_time - self.last_gui_update < self.gui_update_throttle:
-                    time.sleep(0.01)
-                    continue
-                self.last_gui_update = current_time
-
-                needs_update = False
-                with self.app.state_lock:
-                    for i in range(2):
-                        if self.app.audio_state.state['playing'][i]:
-                            needs_update = True
-                            break
-                if needs_update:
-                    self.app.root.after_idle(self._trigger_waveform_update)
-                time.sleep(0.033)
-            except Exception as e:
-                print(f"Error in _schedule_waveform_updates: {e}")
-                time.sleep(0.1)
+    def _schedule_waveform_updates(self):# zleca klatkę w wątku tk, nowa dopiero gdy poprzednia się narysowała
+        if not self._frame_pending:
+            self._frame_pending = True
+            self.app.root.after_idle(self._trigger_waveform_update)
 
     def _trigger_waveform_update(self):
         try:
-            pass
+            self.app.waveform_display.render_frame()
         except Exception as e:
             print(f"Error in _trigger_waveform_update: {e}")
+        finally:
+            self._frame_pending = False
@@ -1,106 +1,215 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.animation import FuncAnimation
 import tkinter as tk
-from typing import List
+import time
+import numpy as np
+from collections import deque
+
+BEAT_COLOR = (0.2, 0.2, 0.2, 0.3) #rgba - zwykły beat
+DOWNBEAT_COLOR = (0.1, 0.1, 0.1, 0.75) #pierwszy beat taktu - ciemniejszy i grubszy
+BEATS_PER_BAR = 4 #analiza nie wykrywa pierwszej ćwierćnuty taktu - takty liczone od pierwszego beatu
 
 class WaveformDisplay: #wyświetlanie ścieżek w oparciu o tkinter i mathplotlib ;0
     def __init__(self, app):
         self.app = app
+        self.num_decks = app.num_decks
         self.fig = None
-        self.ax1 = None
-        self.ax2 = None
-        self.waveform_lines = None
+        self.axes = [] #jeden wykres na deck
+        self.envelopes = list(map(lambda _: [], range(self.num_decks))) #artysty obwiedni min/max i rms dla każdego tracka
+        self.beats = list(map(lambda _: np.zeros(0), range(self.num_decks))) #posortowane czasy beatów - wyszukiwanie binarne
+        self.track_colors = ['blue', 'red', 'darkcyan', 'purple', 'saddlebrown', 'magenta', 'olive', 'navy']
         self.position_lines = None
         self.canvas = None
-        self.anim = None
+        self.canvas_frame = None #ramka z miejscem na wykres - canvas dochodzi po załadowaniu matplotlib w tle
+        self.backgrounds = [None] * self.num_decks #zapamiętane tło każdego wykresu (bez linii pozycji) do blitowania
+        self.rendered = [None] * self.num_decks #(pozycja, kolor) ostatnio narysowanej linii
+        self.dirty = set(range(self.num_decks)) #decki zmienione bez odtwarzania (seek, pauza) - po jednej klatce
+        self.frame_times = deque(maxlen=300)
+        self.skipped_frames = 0
 
     def setup_waveform_display(self, parent): #tworzymy ramke canvas frame i ustawia jej rozmieszczenie
-        canvas_frame = tk.Frame(parent)
-        canvas_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", pady=(10, 0))
-        canvas_frame.columnconfigure(0, weight=1)
-        canvas_frame.rowconfigure(0, weight=1)
-
-        plt.rcParams['animation.embed_limit'] = 2 ** 27
-        plt.rcParams['figure.max_open_warning'] = 0
-
-        self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(10, 6),
-                                                      gridspec_kw={'height_ratios': [1, 1]},
-                                                      tight_layout=True)
-        self.ax1.set_title("Track 1")
-        self.ax2.set_title("Track 2")
-        self.ax1.set_ylabel("Amplitude")
-        self.ax2.set_ylabel("Amplitude")
-        self.ax2.set_xlabel("Time (seconds)")
-        #konfigurujemy dwa wykresy 
-        self.waveform_lines = [
-            self.ax1.plot([], [], color='blue', alpha=0.7, linewidth=0.5)[0],
-            self.ax2.plot([], [], color='red', alpha=0.7, linewidth=0.5)[0]
-        ]
-        self.position_lines = [
-            self.ax1.axvline(x=0, color='green', linestyle='--', linewidth=2, alpha=0.8),
-            self.ax2.axvline(x=0, color='green', linestyle='--', linewidth=2, alpha=0.8)
+        self.canvas_frame = tk.Frame(parent)
+        self.canvas_frame.grid(row=4, column=0, columnspan=2, sticky="nsew", pady=(10, 0))
+        self.canvas_frame.columnconfigure(0, weight=1)
+        self.canvas_frame.rowconfigure(0, weight=1)
+        #sam wykres dopiero w build_canvas - import matplotlib (~1 s) nie opóźnia pokazania okna
+        tk.Label(self.canvas_frame, text="Loading waveforms...").grid(row=0, column=0, sticky="nsew")
+
+    @staticmethod
+    def load_backend(): #import matplotlib w wątku tła; build_canvas w wątku tk zastaje moduły już załadowane
+        import matplotlib.figure
+        import matplotlib.backends.backend_tkagg
+
+    def build_canvas(self): #wątek tk, po load_backend - wykres zamiast napisu i narysowanie wczytanych już utworów
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        try:
+            self.create_figure()
+            for widget in self.canvas_frame.winfo_children():
+                widget.destroy()
+            self.canvas = FigureCanvasTkAgg(self.fig, self.canvas_frame)
+            self.canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+            self.canvas.mpl_connect('button_press_event', self._on_click) #kliknięcie w wykres = seek
+            self.canvas.mpl_connect('scroll_event', self._on_scroll) #kółko myszy = zoom wokół kursora
+            self.setup_animation()
+            for track_index in range(self.num_decks): #utwory wczytane zanim wykres był gotowy
+                self.update_waveform_static(track_index)
+                self.update_beat_grid(track_index)
+            self.canvas.draw_idle()
+        except Exception as e:
+            print(f"Error building waveform canvas: {e}")
+
+    def create_figure(self): #sama figura bez tkintera i pyplot - benchmarki podpinają pod nią canvas Agg
+        from matplotlib.figure import Figure
+        from matplotlib.collections import LineCollection
+        self.fig = Figure(figsize=(10, max(6, 1.5 * self.num_decks)), tight_layout=True)
+        self.axes = list(self.fig.subplots(self.num_decks, 1, squeeze=False)[:, 0])
+        #konfigurujemy wykresy - po jednym na deck
+        for track_index, ax in enumerate(self.axes):
+            ax.set_title(f"Track {track_index + 1}")
+            ax.set_ylabel("Amplitude")
+            ax.set_ylim(-1.05, 1.05)
+            ax.callbacks.connect('xlim_changed', self._on_xlim_changed) #zoom/przesunięcie -> nowe kolumny obwiedni
+            ax.beat_grid_lines = LineCollection([], zorder=1) #cała siatka beatów decka jako jeden artysta
+            ax.add_collection(ax.beat_grid_lines, autolim=False)
+        self.axes[-1].set_xlabel("Time (seconds)")
+        self.position_lines = list(map( #animated - pomijane przy pełnym rysowaniu, rysujemy je tylko blitem
+            lambda ax: ax.axvline(x=0, color='green', linestyle='--', linewidth=2, alpha=0.8, animated=True), self.axes))
+
+    def _on_click(self, event):
+        if event.xdata is None or event.inaxes not in self.axes:
+            return
+        self.app.gui.seek_track(self.axes.index(event.inaxes), max(0.0, event.xdata))
+
+    def _on_scroll(self, event):
+        if event.xdata is None or event.inaxes not in self.axes:
+            return
+        track_index = self.axes.index(event.inaxes)
+        duration = self.app.audio_state.deck(track_index).duration
+        if duration <= 0:
+            return
+        x0, x1 = event.inaxes.get_xlim()
+        scale = 0.8 if event.button == 'up' else 1.25
+        width = min(duration, max((x1 - x0) * scale, 0.05))
+        left = min(max(0.0, event.xdata - (event.xdata - x0) * width / (x1 - x0)), duration - width)
+        event.inaxes.set_xlim(left, left + width)
+        self.canvas.draw_idle()
+
+    def _on_xlim_changed(self, ax):
+        track_index = self.axes.index(ax)
+        self._draw_envelope(track_index)
+        self._draw_beat_grid(track_index)
+
+    def update_beat_grid(self, track_index): #nowe beaty z analizy (albo ich brak po zmianie pliku)
+        try:
+            beats = np.sort(np.asarray(self.app.audio_state.deck(track_index).beat_times, dtype=np.float64))
+            self.beats[track_index] = beats
+            if self.canvas is not None: #przed build_canvas - narysuje go build_canvas
+                self._draw_beat_grid(track_index)
+                self.canvas.draw_idle()
+        except Exception as e:
+            print(f"Error updating beat grid: {e}")
+
+    def _draw_beat_grid(self, track_index): #tylko beaty w widocznym zakresie; przy gęstej siatce same pierwsze beaty taktów
+        beats, ax = self.beats[track_index], self.axes[track_index]
+        first, last = np.searchsorted(beats, ax.get_xlim())
+        indices = np.arange(first, last)
+        limit = max(16, int(ax.bbox.width) // 4) #najwyżej jedna linia na 4 piksele - gęściej to już szara plama
+        if len(indices) > limit:
+            indices = indices[indices % BEATS_PER_BAR == 0]
+        if len(indices) > limit:
+            indices = indices[:0]
+        downbeats = indices % BEATS_PER_BAR == 0
+        segments = np.empty((len(indices), 2, 2))
+        segments[:, :, 0] = beats[indices, None]
+        segments[:, :, 1] = ax.get_ylim()
+        lines = ax.beat_grid_lines
+        lines.set_segments(segments)
+        lines.set_color(np.where(downbeats[:, None], DOWNBEAT_COLOR, BEAT_COLOR))
+        lines.set_linewidth(np.where(downbeats, 1.2, 0.6))
+
+    def _draw_envelope(self, track_index): #kolumny obwiedni tylko dla widocznego zakresu, tyle ile pikseli szerokości
+        pyramid = self.app.audio_state.deck(track_index).waveform
+        ax = self.axes[track_index]
+        for artist in self.envelopes[track_index]:
+            artist.remove()
+        self.envelopes[track_index] = []
+        if pyramid is None:
+            return
+        x0, x1 = ax.get_xlim()
+        times, mins, maxs, rms = pyramid.columns(x0, x1, max(64, int(ax.bbox.width)))
+        color = self.track_colors[track_index % len(self.track_colors)]
+        self.envelopes[track_index] = [
+            ax.fill_between(times, mins, maxs, color=color, alpha=0.4, linewidth=0),
+            ax.fill_between(times, -rms, rms, color=color, alpha=0.8, linewidth=0)
         ]
-        #rysujemy linie pozycji odtwarzania
-        self.ax1.beat_grid_lines = []
-        self.ax2.beat_grid_lines = []
-
-        self.canvas = FigureCanvasTkAgg(self.fig, canvas_frame)
-        self.canvas.get_tk_widget().grid(row=0, column=0, sticky="nsew")
-
-    def setup_animation(self): #wykorzystuje funcAnimation z matplotlib 
-        self.anim = FuncAnimation(
-            self.fig,
-            self.update_waveform,
-            interval=33,#aktualizacja pozycji odtwarzania
-            blit=False,
-            cache_frame_data=False,
-            repeat=True
-        )
+
+    def setup_animation(self): #zamiast FuncAnimation - klatki zleca scheduler, tylko gdy coś gra albo się zmieniło
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event): #po pełnym przerysowaniu zapamiętujemy tła i dorysowujemy linie
+        self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax in self.axes]
+        for ax, line in zip(self.axes, self.position_lines):
+            ax.draw_artist(line)
+        self.rendered = [None] * self.num_decks
+        self.mark_dirty()
+
+    def mark_dirty(self, *tracks): #seek/pauza/stop - pozycja zmienia się bez odtwarzania; bez argumentów - wszystkie decki
+        self.dirty.update(tracks or range(self.num_decks))
+        self.app.scheduler.notify()
+
+    def needs_frame(self) -> bool: #bez canvasu nie ma czego rysować - scheduler nie budzi się na próżno
+        return self.canvas is not None and (bool(self.dirty) or self.app.audio_state.any_playing())
 
     def update_waveform_static(self, track_index): #rysowanie statycznego wykresu tracka (jak nie jest zapauzowany albo puszczony)
         try:
-            with self.app.state_lock:
-                data = self.app.audio_state.state['waveform_cache'][track_index]
-                time_axis = self.app.audio_state.state['time_axes'][track_index]
-                duration = self.app.audio_state.state['durations'][track_index]
-
-            if data is not None and time_axis is not None:
-                ax = self.ax1 if track_index == 0 else self.ax2
-                line = self.waveform_lines[track_index]
-
-                ax.clear()
-                ax.plot(time_axis, data, color='blue' if track_index == 0 else 'red', alpha=0.7, linewidth=0.5)
-                ax.set_title(f"Track {track_index + 1}")
-                ax.set_ylabel("Amplitude")
-                if track_index == 1:
-                    ax.set_xlabel("Time (seconds)")
-                ax.set_xlim(0, duration)
-
-                self.position_lines[track_index] = ax.axvline(x=0, color='green', linestyle='--', linewidth=2,
-                                                              alpha=0.8)
+            deck = self.app.audio_state.deck(track_index) #jeden spójny snapshot - bez locka
+
+            if deck.waveform is not None and self.canvas is not None: #przed build_canvas - narysuje go build_canvas
+                ax = self.axes[track_index]
+                ax.set_xlim(0, deck.duration) #xlim_changed rysuje obwiednię i siatkę - drugi raz tu nie trzeba
                 self.canvas.draw_idle()
 
         except Exception as e:
             print(f"Error updating waveform: {e}")
 
-    def update_waveform(self, frame): # live-time wskaźnik dla naszych waveformów oraz zmiana jego kolorów z zależności od stanu
-        for track_idx in range(2):
-            if (self.app.audio_state.state['data'][track_idx] is not None and
-                    self.app.audio_state.state['durations'][track_idx] > 0):
-                pos = self.app.audio_state.state['current_positions'][track_idx]
-                pos = max(0, min(pos, self.app.audio_state.state['durations'][track_idx]))
-                line = self.position_lines[track_idx]
-                line.set_xdata([pos, pos])
-
-                if self.app.audio_state.state['playing'][track_idx]:
-                    color = 'green'
-                elif self.app.audio_state.state['paused'][track_idx]:
-                    color = 'orange'
-                else:
-                    color = 'red'
-                line.set_color(color)
-                line.set_alpha(0.8)
-
-        self.fig.canvas.draw_idle() #odswieżamy tylko zieloną linie
-        return self.position_lines
+    def render_frame(self): # live-time wskaźnik dla naszych waveformów oraz zmiana jego kolorów z zależności od stanu
+        if None in self.backgrounds: #tło jeszcze nienarysowane - pierwszy draw_event zrobi resztę
+            return
+        started = time.perf_counter()
+        dirty, self.dirty = self.dirty, set()
+        blitted = False
+        decks = self.app.audio_state.snapshot() #stan wszystkich decków z jednej chwili - bez locka i bez rozdartych odczytów
+        #tylko grające i zmienione decki - koszt klatki rośnie z liczbą aktywnych, nie wszystkich decków
+        for track_idx in sorted(dirty.union(filter(lambda i: decks[i].playing, range(self.num_decks)))):
+            deck, ax = decks[track_idx], self.axes[track_idx]
+            if deck.waveform is None or deck.duration <= 0:
+                continue
+            pos = max(0, min(deck.current_position, deck.duration))
+            if deck.playing:
+                color = 'green'
+            elif deck.paused:
+                color = 'orange'
+            else:
+                color = 'red'
+            if self.rendered[track_idx] == (pos, color): #nic się nie zmieniło - bez rysowania
+                continue
+            line = self.position_lines[track_idx]
+            line.set_xdata([pos, pos])
+            line.set_color(color)
+            self.canvas.restore_region(self.backgrounds[track_idx]) #tło z cache zamiast pełnego rysowania
+            ax.draw_artist(line)
+            self.canvas.blit(ax.bbox)
+            self.rendered[track_idx] = (pos, color)
+            blitted = True
+        if blitted:
+            self.frame_times.append(time.perf_counter() - started)
+            self.app.metrics.observe('frame_time', self.frame_times[-1])
+        else:
+            self.skipped_frames += 1
+
+    def frame_stats(self) -> dict: #czas klatki w ms - ma zostać w granicach kilku ms
+        times = list(self.frame_times) or [0.0]
+        return {
+            'avg_ms': 1000 * sum(times) / len(times),
+            'max_ms': 1000 * max(times),
+            'frames': len(self.frame_times),
+            'skipped': self.skipped_frames
+        }